@@ -0,0 +1,472 @@
+# async_engine.py
+"""
+asyncio scraping engine, an alternative to ScraperLogic's thread pools for large channel sets.
+
+Every channel gets its own polling task and downloads run as tasks on the same event loop,
+so thousands of channels cost thousands of small coroutines instead of threads. Stopping
+cancels the tasks; an interrupted download keeps its .part file for the next resume.
+State, dedup, categorization, proxy pools and rate limiting are ScraperLogic's own; only
+network I/O and scheduling differ. Anything that touches the disk (chunk writes and hashing,
+state checkpoints, the retry queue, proxy health saves) runs in worker threads, so the loop
+itself only moves bytes between sockets and buffers. Requires httpx (HTTP/2 as well if h2
+is installed).
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import importlib.util
+
+from config import *
+from scraper_logic import ScraperLogic, PartFileWriter, DownloadError
+from routing import API_TRAFFIC, DOWNLOAD_TRAFFIC
+from utils import ContentHasher, generate_clean_filename
+from cdn_urls import is_url_stale
+from lanes import AsyncLaneQueue, LIVE_LANE, RETRY_LANE, BACKFILL_LANE
+
+try:
+    import httpx # Optional: only this engine needs it
+except ImportError:
+    httpx = None
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None # Optional: enables HTTP/2 in httpx
+
+
+class AsyncScraperLogic(ScraperLogic):
+    """Same public surface as ScraperLogic: run(), paused, stop_event and status messages on gui_queue."""
+
+    def __init__(self, *args, **kwargs):
+        if httpx is None:
+            raise RuntimeError("The asyncio engine needs httpx: pip install httpx h2")
+        super().__init__(*args, **kwargs)
+        self.clients = {}
+        # Health is recorded on the loop for every request; the housekeeping task saves it from a thread.
+        for route in self.routes.values():
+            if route.pool:
+                route.pool.autosave = False
+
+    def run(self):
+        self._start_services()
+        try:
+            asyncio.run(self._main())
+        finally:
+            self._stop_services()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.slots = {
+            API_TRAFFIC: asyncio.Semaphore(max(1, ASYNC_API_MAX_CONCURRENT)),
+            DOWNLOAD_TRAFFIC: asyncio.Semaphore(max(1, ASYNC_DOWNLOAD_TASKS)),
+        }
+        self.async_queue = AsyncLaneQueue(DOWNLOAD_QUEUE_SIZE)
+        # As in the threaded engine, one poll slot is always left for live catch-up.
+        self.async_backfill_slots = asyncio.Semaphore(max(1, ASYNC_MAX_ACTIVE_POLLS - 1))
+
+        tasks = [asyncio.create_task(self._download_task()) for _ in range(max(1, ASYNC_DOWNLOAD_TASKS))]
+        tasks.append(asyncio.create_task(self._dispatch_polls()))
+        tasks.append(asyncio.create_task(self._housekeeping()))
+        tasks.append(asyncio.create_task(self._retry_task()))
+        logging.info(f"Async engine polling {len(self.channels_to_scan)} channels with {ASYNC_DOWNLOAD_TASKS} download tasks.")
+        self._update_gui_status("Scraper Started.")
+
+        # The GUI sets stop_event from its own thread; wait for it off the loop, then cancel everything.
+        await asyncio.to_thread(self.stop_event.wait)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        dropped = self.async_queue.qsize()
+        for _ in range(dropped):
+            attachment, message_data, channel_id = self.async_queue.get_nowait()
+            self._schedule_retry(attachment, message_data, channel_id, "stopped before the download started", count_attempt=False)
+        if dropped:
+            logging.info(f"{dropped} queued downloads were not started before stopping; they were moved to the retry queue.")
+        await asyncio.gather(*(client.aclose() for client in self.clients.values()), return_exceptions=True)
+
+    async def _wait_while_paused(self):
+        while self.paused:
+            await asyncio.sleep(1)
+
+    async def _housekeeping(self):
+        """Periodic checkpoint and status line, in place of the threaded engine's end-of-cycle work."""
+        while True:
+            await asyncio.sleep(STATE_SAVE_INTERVAL_SECONDS)
+            await asyncio.to_thread(self._save_state)
+            for route in self.routes.values():
+                if route.pool:
+                    await asyncio.to_thread(route.pool.save)
+            if not self.paused:
+                self._update_gui_status(f"Polling {self.channel_scheduler.summary()}; {self.async_queue.qsize()} downloads queued...")
+
+    async def _retry_task(self):
+        """Async counterpart of _retry_loop."""
+        while True:
+            await self._wait_while_paused()
+            try:
+                requeued = 0
+                for item in await asyncio.to_thread(self._due_retries):
+                    requeued += await self._enqueue_download_async(*item, lane=RETRY_LANE)
+                if requeued:
+                    logging.info(f"Requeued {requeued} downloads from the retry queue.")
+            except Exception as e:
+                logging.error(f"Retry scheduler failed: {e}")
+            await asyncio.sleep(RETRY_POLL_INTERVAL_SECONDS)
+
+    # --- HTTP ---
+
+    def _client_for(self, proxy: str):
+        client = self.clients.get(proxy)
+        if client is None:
+            headers = {"Authorization": self.token, "User-Agent": random.choice(USER_AGENT_LIST)}
+            limits = httpx.Limits(max_connections=ASYNC_API_MAX_CONCURRENT + ASYNC_DOWNLOAD_TASKS,
+                                  max_keepalive_connections=TRANSPORT_POOL_SIZE)
+            try:
+                client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, proxy=proxy, headers=headers, limits=limits, follow_redirects=True)
+            except (ImportError, ValueError) as e:
+                # A SOCKS proxy without socksio, or a scheme httpx rejects: fail this proxy, not the request.
+                raise httpx.ProxyError(f"cannot use proxy {proxy}: {e}") from e
+            self.clients[proxy] = client
+        return client
+
+    async def _acquire_rate_limit(self, route: str):
+        while True:
+            wait = self.rate_limiter.try_acquire(route)
+            if not wait:
+                return
+            await asyncio.sleep(wait + RATE_LIMIT_SAFETY_MARGIN)
+
+    async def _send(self, url: str, proxy: str, route, stream: bool, method: str = "GET", **request_kwargs):
+        """Async counterpart of _send_request. Returns (response or None on an HTTP error, seconds to headers)."""
+        client = self._client_for(proxy)
+        api_route = self.rate_limiter.route_key(method, url) if self.rate_limiter.is_api_url(url) else None
+        connect_timeout, read_timeout = route.timeout
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        for _ in range(RATE_LIMIT_MAX_RETRIES + 1):
+            if api_route:
+                await self._acquire_rate_limit(api_route)
+            started_at = time.monotonic()
+            response = await client.send(client.build_request(method, url, timeout=timeout, **request_kwargs), stream=stream)
+            response.via_proxy = proxy
+            latency = time.monotonic() - started_at
+            if not api_route:
+                break
+            self.rate_limiter.update(api_route, response.headers)
+            if response.status_code != 429:
+                break
+            await response.aread()
+            retry_after = self.rate_limiter.handle_429(api_route, response)
+            await response.aclose()
+            self._update_gui_status(f"Rate limited by Discord. Backing off {retry_after:.1f}s...")
+        if response.status_code >= 400:
+            # A real answer from Discord; trying another proxy will not change it.
+            logging.error(f"Request to {url} failed: HTTP {response.status_code}")
+            await response.aclose()
+            return None, latency
+        return response, latency
+
+    async def _request(self, url: str, traffic: str = API_TRAFFIC, stream: bool = False, **request_kwargs):
+        """
+        Async counterpart of _execute_request_with_failover: same routes, proxy pools and health
+        scoring. Streamed responses are read after this returns, so their callers hold the slot.
+        """
+        if stream:
+            return await self._request_on_route(url, traffic, stream, request_kwargs)
+        async with self.slots[traffic]:
+            return await self._request_on_route(url, traffic, stream, request_kwargs)
+
+    async def _request_on_route(self, url: str, traffic: str, stream: bool, request_kwargs: dict):
+        route = self.routes[traffic]
+        proxy_pool = route.pool
+        if route.direct:
+            try:
+                return (await self._send(url, None, route, stream, **request_kwargs))[0]
+            except httpx.HTTPError as e:
+                logging.error(f"Direct request to {url} failed: {e!r}")
+                return None
+
+        tried = set()
+        while len(tried) < len(proxy_pool):
+            current_proxy_url = proxy_pool.choose(exclude=tried)
+            if current_proxy_url is None: break
+            tried.add(current_proxy_url)
+            try:
+                response, latency = await self._send(url, current_proxy_url, route, stream, **request_kwargs)
+                proxy_pool.record_success(current_proxy_url, latency)
+                return response
+            except httpx.TimeoutException as e:
+                quarantine = proxy_pool.record_failure(current_proxy_url, hard=False)
+                if quarantine:
+                    logging.error(f"Proxy {current_proxy_url} timed out {PROXY_SOFT_FAILURE_LIMIT} times in a row. Quarantined for {quarantine:.0f}s.")
+                else:
+                    logging.warning(f"Proxy {current_proxy_url} timed out. Reason: {e!r}")
+            except httpx.HTTPError as e:
+                quarantine = proxy_pool.record_failure(current_proxy_url, hard=True)
+                logging.error(f"Proxy {current_proxy_url} failed ({type(e).__name__}). Quarantined for {quarantine:.0f}s.")
+
+        logging.error(f"All {route.name} proxies failed for the request to {url}.")
+        return None
+
+    def _post_refresh_urls(self, urls: list):
+        """Called from worker threads (see _ensure_fresh_url); the request itself runs on the event loop."""
+        request = self._request(f"{DISCORD_API_BASE}/attachments/refresh-urls", method="POST", json={"attachment_urls": urls})
+        response = asyncio.run_coroutine_threadsafe(request, self.loop).result()
+        return response.json().get("refreshed_urls", []) if response is not None else None
+
+    async def _ensure_fresh_url_async(self, attachment: dict):
+        if is_url_stale(attachment["url"]):
+            # Refreshes are batched across downloads by blocking calls, so they wait in a worker thread.
+            await asyncio.to_thread(self._ensure_fresh_url, attachment)
+
+    # --- Channel polling ---
+
+    async def _dispatch_polls(self):
+        """Starts a poll task for every channel the scheduler says is due, up to ASYNC_MAX_ACTIVE_POLLS at once."""
+        polls = set()
+        try:
+            while True:
+                await self._wait_while_paused()
+                for channel_id in self.channel_scheduler.pop_due(max(1, ASYNC_MAX_ACTIVE_POLLS) - len(polls)):
+                    poll = asyncio.create_task(self._poll_channel(channel_id))
+                    polls.add(poll)
+                    poll.add_done_callback(polls.discard)
+                await asyncio.sleep(min(self.channel_scheduler.next_due_in(), 1.0))
+        finally:
+            for poll in polls:
+                poll.cancel()
+            await asyncio.gather(*polls, return_exceptions=True)
+
+    async def _poll_channel(self, channel_id: str):
+        """Async counterpart of _scan_channel."""
+        try:
+            result = await self._process_channel_async(channel_id)
+        except Exception as e:
+            logging.error(f"Scan of channel {channel_id} failed: {e}")
+            result = None
+        await asyncio.to_thread(self._reschedule_channel, channel_id, result)
+
+    async def _process_channel_async(self, channel_id: str) -> dict:
+        scan_mode = self.channels_to_scan[channel_id]
+        url = f"{DISCORD_API_BASE}/channels/{channel_id}/messages"
+        result = await self._catch_up_new_messages_async(channel_id, url)
+
+        history_complete_key = f"{channel_id}_history_complete"
+        backfilled = False
+        if scan_mode == 'full_scan' and not self.scraper_state.get(history_complete_key, False) and not self.async_backfill_slots.locked():
+            async with self.async_backfill_slots:
+                await self._backfill_history_async(channel_id, url)
+                backfilled = True
+        result["backlog"] = not result["caught_up"] or (backfilled and not self.scraper_state.get(history_complete_key, False))
+        return result
+
+    async def _fetch_page(self, url: str, params: dict):
+        response = await self._request(url, params=params)
+        return response.json() if response is not None else None
+
+    async def _catch_up_new_messages_async(self, channel_id: str, url: str) -> dict:
+        """Same paging as _catch_up_new_messages, on the event loop."""
+        after_key = f"{channel_id}_after"
+        pages = new_messages = videos_found = 0
+        caught_up = False
+        while not (CATCHUP_MAX_PAGES_PER_CYCLE and pages >= CATCHUP_MAX_PAGES_PER_CYCLE):
+            after_id = self.scraper_state.get(after_key)
+            params = {'limit': MESSAGES_LIMIT}
+            if after_id:
+                params['after'] = after_id
+
+            messages = await self._fetch_page(url, params)
+            if messages is None:
+                break
+            pages += 1
+
+            if messages:
+                messages.reverse()
+                videos_found += await self._process_messages_async(messages, channel_id)
+                new_messages += len(messages)
+                await asyncio.to_thread(self._update_state, {after_key: messages[-1]['id']})
+
+            if len(messages) < MESSAGES_LIMIT or not after_id:
+                caught_up = True
+                break
+        return self._finish_catch_up(channel_id, pages, new_messages, videos_found, caught_up)
+
+    async def _backfill_history_async(self, channel_id: str, url: str):
+        """Same paging as _backfill_history, on the event loop."""
+        before_key = f"{channel_id}_before"
+        started_at = time.monotonic()
+        pages = videos_found = 0
+        while True:
+            if BACKFILL_MAX_PAGES_PER_CYCLE and pages >= BACKFILL_MAX_PAGES_PER_CYCLE: break
+            if BACKFILL_MAX_SECONDS_PER_CYCLE and time.monotonic() - started_at >= BACKFILL_MAX_SECONDS_PER_CYCLE: break
+
+            params = {'limit': MESSAGES_LIMIT}
+            before_id = self.scraper_state.get(before_key)
+            if before_id:
+                params['before'] = before_id
+
+            messages = await self._fetch_page(url, params)
+            if messages is None:
+                break
+            pages += 1
+
+            if messages:
+                videos_found += await self._process_messages_async(messages, channel_id, BACKFILL_LANE)
+                await asyncio.to_thread(self._update_state, {before_key: messages[-1]['id']})
+
+            if len(messages) < MESSAGES_LIMIT:
+                await asyncio.to_thread(self._mark_history_complete, channel_id)
+                break
+
+        logging.info(f"Backfill of {channel_id} covered {pages} pages ({videos_found} videos) in {time.monotonic() - started_at:.1f}s this pass.")
+
+    async def _process_messages_async(self, messages: list, channel_id: str, lane: str = LIVE_LANE) -> int:
+        found_count = 0
+        for attachment, msg in self._video_attachments(messages):
+            found_count += await self._enqueue_download_async(attachment, msg, channel_id, lane)
+        return found_count
+
+    async def _enqueue_download_async(self, attachment: dict, message_data: dict, channel_id: str, lane: str = LIVE_LANE) -> bool:
+        unique_id = f"{message_data['id']}-{attachment['id']}"
+        if not self._claim_attachment(unique_id):
+            return False
+        try:
+            # Bounded queue: paging waits here while the download tasks are busy.
+            await self.async_queue.put(lane, (attachment, message_data, channel_id))
+        except asyncio.CancelledError:
+            self._release_attachment(unique_id)
+            raise
+        return True
+
+    # --- Downloads ---
+
+    async def _download_task(self):
+        while True:
+            await self._wait_while_paused()
+            attachment, message_data, channel_id = await self.async_queue.get()
+            try:
+                await self._download_file_async(attachment, message_data, channel_id)
+            finally:
+                self._release_attachment(f"{message_data['id']}-{attachment['id']}")
+
+    async def _download_file_async(self, attachment: dict, message_data: dict, channel_id: str):
+        """Same flow as _download_file; blocking disk and database work runs in worker threads."""
+        unique_id = f"{message_data['id']}-{attachment['id']}"
+        if unique_id in self.downloaded_attachments:
+            await asyncio.to_thread(self._clear_retry, unique_id)
+            return
+
+        final_filename = generate_clean_filename(attachment.get("filename"), message_data.get("content", ""))
+        expected_size = attachment.get("size")
+
+        try:
+            await self._ensure_fresh_url_async(attachment)
+            candidates = await asyncio.to_thread(self._repost_candidates, attachment, unique_id)
+            if candidates:
+                repost = self._match_repost(candidates, await self._fetch_head_digest_async(attachment))
+                if repost:
+                    await asyncio.to_thread(self._record_repost, attachment, message_data, channel_id, unique_id, final_filename, repost)
+                    await asyncio.to_thread(self._clear_retry, unique_id)
+                    return
+
+            for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+                try:
+                    if attempt > 1:
+                        await self._ensure_fresh_url_async(attachment)
+                    streamed = await self._stream_attachment_async(attachment, unique_id)
+                    file_size = self._verify_part_size(streamed[0], expected_size)
+                    break
+                except (DownloadError, httpx.HTTPError) as e:
+                    if attempt == DOWNLOAD_MAX_ATTEMPTS:
+                        logging.error(f"Download failed for {attachment.get('filename')} after {attempt} attempts: {e!r}")
+                        await asyncio.to_thread(self._schedule_retry, attachment, message_data, channel_id, repr(e))
+                        return
+                    logging.warning(f"Attempt {attempt}/{DOWNLOAD_MAX_ATTEMPTS} for {attachment.get('filename')} failed: {e!r}")
+                    await asyncio.sleep(min(2 ** attempt, 30))
+
+            await asyncio.to_thread(self._finalize_download, attachment, message_data, channel_id, unique_id, final_filename, streamed, file_size)
+            await asyncio.to_thread(self._clear_retry, unique_id)
+
+        except asyncio.CancelledError:
+            logging.info(f"Download of {attachment.get('filename')} cancelled by stop signal; partial file kept for resume.")
+            self._schedule_retry(attachment, message_data, channel_id, "interrupted by stop", count_attempt=False)
+            raise
+        except Exception as e:
+            logging.error(f"Failed to download {attachment.get('filename')}: {e}")
+            await asyncio.to_thread(self._schedule_retry, attachment, message_data, channel_id, e)
+
+    async def _stream_attachment_async(self, attachment: dict, unique_id: str):
+        """Same as _stream_attachment: resumes a .part with a Range request and returns (part_path, sniff_result, hasher)."""
+        part_path = self._find_part_file(unique_id)
+        offset = os.path.getsize(part_path) if part_path else 0
+        expected_size = attachment.get("size")
+        if part_path and expected_size and offset >= expected_size:
+            return await asyncio.to_thread(lambda: PartFileWriter(self._new_part_path, unique_id, part_path).finish())
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        async with self.slots[DOWNLOAD_TRAFFIC]:
+            response = await self._request(attachment["url"], DOWNLOAD_TRAFFIC, headers=headers, stream=True)
+            if response is None:
+                raise DownloadError("request failed on every route")
+            try:
+                part_path = self._check_resume(attachment, part_path, offset, response.status_code)
+                # Hashing a resumed part reads it from disk, so that happens off the event loop.
+                writer = await asyncio.to_thread(PartFileWriter, self._new_part_path, unique_id, part_path)
+                try:
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        # Writing also hashes the chunk and feeds the sniffer, so it all happens in a thread.
+                        await _in_thread(writer.write, chunk)
+                        await self._throttle_async(response, len(chunk))
+                    return await _in_thread(writer.finish)
+                finally:
+                    writer.close()
+            finally:
+                await response.aclose()
+
+    async def _throttle_async(self, response, received: int):
+        delay = self.bandwidth.consume(response.via_proxy, received)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _fetch_head_digest_async(self, attachment: dict):
+        """Same as _fetch_head_digest: hashes the first PARTIAL_HASH_BYTES, or returns None."""
+        head_size = min(PARTIAL_HASH_BYTES, attachment["size"])
+        hasher = ContentHasher()
+        received = 0
+        async with self.slots[DOWNLOAD_TRAFFIC]:
+            response = await self._request(attachment["url"], DOWNLOAD_TRAFFIC, headers={"Range": f"bytes=0-{head_size - 1}"}, stream=True)
+            if response is None:
+                return None
+            try:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    chunk = chunk[:head_size - received]
+                    hasher.update(chunk)
+                    received += len(chunk)
+                    await self._throttle_async(response, len(chunk))
+                    if received >= head_size:
+                        break
+            except httpx.HTTPError:
+                return None
+            finally:
+                await response.aclose()
+        return hasher.head_digest() if received == head_size else None
+
+
+async def _in_thread(func, *args):
+    """
+    asyncio.to_thread that, when cancelled, still waits for the thread to return before unwinding,
+    so cleanup never runs alongside a write that is still in progress.
+    """
+    work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(work)
+    except asyncio.CancelledError:
+        await asyncio.wait([work])
+        raise
+
+
+def select_engine():
+    """Returns the scraper class picked by SCRAPER_ENGINE, falling back to threads if httpx is missing."""
+    if SCRAPER_ENGINE == "asyncio":
+        if httpx is not None:
+            return AsyncScraperLogic
+        logging.warning("SCRAPER_ENGINE is 'asyncio' but httpx is not installed; using the threaded engine.")
+    return ScraperLogic
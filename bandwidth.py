@@ -0,0 +1,125 @@
+# bandwidth.py
+import time
+import threading
+import collections
+
+from config import (
+    BANDWIDTH_LIMIT_BYTES_PER_SECOND, BANDWIDTH_PER_PROXY_BYTES_PER_SECOND, BANDWIDTH_PROXY_LIMITS,
+    BANDWIDTH_BURST_SECONDS, BANDWIDTH_METER_SECONDS
+)
+from utils import normalize_proxy_url
+
+
+def format_rate(bytes_per_second: float) -> str:
+    """Formats a byte rate for display, e.g. '3.2 MB/s'."""
+    if bytes_per_second >= 1024 * 1024:
+        return f"{bytes_per_second / (1024 * 1024):.1f} MB/s"
+    return f"{bytes_per_second / 1024:.0f} KB/s"
+
+
+class TokenBucket:
+    """
+    Allows `rate` bytes per second on average, with bursts of up to BANDWIDTH_BURST_SECONDS of it.
+    reserve() takes the tokens at once, going into debt if the bucket is short, and returns how
+    long the caller must wait to pay it back, so threads and coroutines can both use it.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate: float):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self._tokens = rate * BANDWIDTH_BURST_SECONDS
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.rate * BANDWIDTH_BURST_SECONDS, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            if not self.rate:
+                self._tokens = rate * BANDWIDTH_BURST_SECONDS
+            self.rate = rate
+            self._tokens = min(self._tokens, rate * BANDWIDTH_BURST_SECONDS)
+
+    def reserve(self, amount: int) -> float:
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class _ThroughputMeter:
+    """Bytes per second over the last BANDWIDTH_METER_SECONDS, counted in one-second slots."""
+
+    def __init__(self):
+        self._slots = collections.deque()  # [second, bytes]
+
+    def add(self, amount: int, now: float):
+        second = int(now)
+        if self._slots and self._slots[-1][0] == second:
+            self._slots[-1][1] += amount
+        else:
+            self._slots.append([second, amount])
+        self._trim(now)
+
+    def _trim(self, now: float):
+        while self._slots and self._slots[0][0] <= now - BANDWIDTH_METER_SECONDS:
+            self._slots.popleft()
+
+    def rate(self, now: float) -> float:
+        self._trim(now)
+        return sum(amount for _, amount in self._slots) / BANDWIDTH_METER_SECONDS
+
+
+class BandwidthLimiter:
+    """
+    Shapes download bandwidth with one token bucket for all traffic and one per proxy, and
+    measures the throughput it lets through. Download streams call consume() for every chunk
+    and wait the seconds it returns. Limits can be changed while downloads are running.
+    Shared by every thread that downloads.
+    """
+
+    def __init__(self, total_rate: float = BANDWIDTH_LIMIT_BYTES_PER_SECOND,
+                 per_proxy_rate: float = BANDWIDTH_PER_PROXY_BYTES_PER_SECOND):
+        self._lock = threading.Lock()
+        self.total = TokenBucket(total_rate)
+        self.per_proxy_rate = per_proxy_rate
+        self._proxy_limits = {normalize_proxy_url(proxy): rate for proxy, rate in BANDWIDTH_PROXY_LIMITS.items()}
+        self._proxy_buckets = {}
+        self._meters = collections.defaultdict(_ThroughputMeter)
+
+    def set_limits(self, total_rate: float, per_proxy_rate: float):
+        with self._lock:
+            self.total.set_rate(total_rate)
+            self.per_proxy_rate = per_proxy_rate
+            for proxy, bucket in self._proxy_buckets.items():
+                bucket.set_rate(self._proxy_limits.get(proxy, per_proxy_rate))
+
+    def consume(self, proxy: str, amount: int) -> float:
+        """Accounts for `amount` bytes received via `proxy` (None when direct). Returns the seconds to wait."""
+        with self._lock:
+            self._meters[proxy or "direct"].add(amount, time.monotonic())
+            bucket = None
+            if proxy:
+                bucket = self._proxy_buckets.get(proxy)
+                if bucket is None:
+                    bucket = self._proxy_buckets[proxy] = TokenBucket(self._proxy_limits.get(proxy, self.per_proxy_rate))
+        wait = self.total.reserve(amount)
+        if bucket:
+            wait = max(wait, bucket.reserve(amount))
+        return wait
+
+    def throughput(self) -> dict:
+        """Current bytes per second per route ('direct' or a proxy URL)."""
+        now = time.monotonic()
+        with self._lock:
+            return {route: meter.rate(now) for route, meter in self._meters.items()}
+
+    def summary(self) -> str:
+        total = sum(self.throughput().values())
+        limit = f" of {format_rate(self.total.rate)}" if self.total.rate else ""
+        return f"{format_rate(total)}{limit}"
@@ -0,0 +1,100 @@
+# cdn_urls.py
+"""
+Discord CDN attachment URLs are signed and expire: the 'ex' query parameter is the expiry
+as a hex Unix timestamp. A download that waits in a queue for hours would fail with a 403
+once it passes. Discord can re-sign up to 50 URLs in one API call, so stale URLs are
+refreshed in batches instead of refetching the message page of every file.
+"""
+import time
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+from config import CDN_URL_REFRESH_MARGIN_SECONDS, CDN_URL_REFRESH_BATCH_SIZE, CDN_URL_REFRESH_WINDOW_SECONDS
+
+
+def url_expires_at(url: str):
+    """Returns the Unix time a signed CDN URL expires at, or None for an unsigned URL."""
+    try:
+        return float(int(parse_qs(urlsplit(url).query)["ex"][0], 16))
+    except (KeyError, IndexError, ValueError):
+        return None
+
+def is_url_stale(url: str, margin: float = CDN_URL_REFRESH_MARGIN_SECONDS) -> bool:
+    expires_at = url_expires_at(url)
+    return expires_at is not None and expires_at - margin <= time.time()
+
+
+class _Batch:
+    __slots__ = ("urls", "full", "done", "results")
+
+    def __init__(self):
+        self.urls = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = {}
+
+
+class AttachmentUrlRefresher:
+    """
+    Refreshes stale attachment URLs in batches. send_batch(urls) makes the API call and returns
+    its [{"original": ..., "refreshed": ...}] list, or None if the call failed.
+
+    refresh() is called by download threads one URL at a time: the first caller waits up to
+    CDN_URL_REFRESH_WINDOW_SECONDS for others to join its batch, then sends it for all of them.
+    """
+
+    def __init__(self, send_batch):
+        self.send_batch = send_batch
+        self._lock = threading.Lock()
+        self._pending = None
+        self.refreshed_count = 0
+
+    def refresh_many(self, urls: list) -> dict:
+        """Refreshes URLs directly, CDN_URL_REFRESH_BATCH_SIZE per call. Returns {original: refreshed}."""
+        refreshed = {}
+        urls = list(dict.fromkeys(urls))
+        for start in range(0, len(urls), CDN_URL_REFRESH_BATCH_SIZE):
+            chunk = urls[start:start + CDN_URL_REFRESH_BATCH_SIZE]
+            try:
+                results = self.send_batch(chunk)
+            except Exception as e:
+                logging.error(f"Refreshing {len(chunk)} attachment URLs failed: {e}")
+                continue
+            if results is None:
+                logging.warning(f"Refreshing {len(chunk)} attachment URLs failed.")
+                continue
+            for item in results:
+                if item.get("original") in chunk and item.get("refreshed"):
+                    refreshed[item["original"]] = item["refreshed"]
+        self.refreshed_count += len(refreshed)
+        if refreshed:
+            logging.info(f"Refreshed {len(refreshed)} of {len(urls)} expired attachment URLs.")
+        return refreshed
+
+    def refresh(self, url: str):
+        """Returns a freshly signed copy of url, or None if Discord did not refresh it."""
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            if url not in batch.urls:
+                batch.urls.append(url)
+            if len(batch.urls) >= CDN_URL_REFRESH_BATCH_SIZE:
+                self._pending = None
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+            return batch.results.get(url)
+
+        try:
+            batch.full.wait(CDN_URL_REFRESH_WINDOW_SECONDS)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+            batch.results = self.refresh_many(batch.urls)
+        finally:
+            batch.done.set()
+        return batch.results.get(url)
@@ -0,0 +1,101 @@
+# channel_scheduler.py
+import time
+import heapq
+import random
+import threading
+
+from config import (
+    SLEEP_AFTER_NO_MESSAGES, CHANNEL_POLL_MIN_SECONDS, CHANNEL_POLL_MAX_SECONDS, CHANNEL_POLL_TARGET_MESSAGES,
+    CHANNEL_POLL_LOW_YIELD, CHANNEL_POLL_LOW_YIELD_FACTOR, CHANNEL_ACTIVITY_EWMA_ALPHA
+)
+
+
+class _ChannelActivity:
+    __slots__ = ("message_rate", "video_yield", "interval", "polled_at", "next_due")
+
+    def __init__(self, message_rate=None, video_yield=None, interval=SLEEP_AFTER_NO_MESSAGES, polled_at=None):
+        self.message_rate = message_rate  # EWMA of new messages per second, None until two polls have happened
+        self.video_yield = video_yield    # EWMA of videos per new message
+        self.interval = interval          # seconds between polls, as last computed
+        self.polled_at = polled_at        # wall-clock time of the last poll, so backoff survives a restart
+        self.next_due = time.time() if polled_at is None else polled_at + interval
+
+    def to_dict(self) -> dict:
+        return {"message_rate": self.message_rate, "video_yield": self.video_yield,
+                "interval": self.interval, "polled_at": self.polled_at}
+
+
+def _ewma(previous, sample: float) -> float:
+    return sample if previous is None else previous + CHANNEL_ACTIVITY_EWMA_ALPHA * (sample - previous)
+
+
+class ChannelScheduler:
+    """
+    Decides when each channel is polled next, instead of sweeping every channel at the same pace.
+
+    Each poll's result feeds an EWMA of the channel's message rate and video yield. A busy channel
+    is polled about every CHANNEL_POLL_TARGET_MESSAGES messages, a channel that rarely posts videos
+    less often, and a channel with nothing new doubles its interval each time, up to
+    CHANNEL_POLL_MAX_SECONDS. Channels still behind or backfilling history come back after
+    CHANNEL_POLL_MIN_SECONDS. Due channels come out of a heap ordered by next-due time.
+    Shared by every scanner thread.
+    """
+
+    def __init__(self, channel_ids: list[str], saved_activity: dict):
+        self._lock = threading.Lock()
+        self._activity = {}
+        self._heap = []
+        for channel_id in channel_ids:
+            activity = self._activity[channel_id] = _ChannelActivity(**(saved_activity.get(channel_id) or {}))
+            heapq.heappush(self._heap, (activity.next_due, channel_id))
+
+    def pop_due(self, limit: int) -> list[str]:
+        """Takes up to `limit` channels whose poll is due, most overdue first. They are rescheduled by record()."""
+        due = []
+        now = time.time()
+        with self._lock:
+            while self._heap and len(due) < limit and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def next_due_in(self) -> float:
+        """Seconds until the next scheduled poll (infinite when every channel is being polled)."""
+        with self._lock:
+            return max(0.0, self._heap[0][0] - time.time()) if self._heap else float("inf")
+
+    def record(self, channel_id: str, result) -> dict:
+        """
+        Updates a channel's activity from a _process_channel result (None if the scan failed) and
+        schedules its next poll. Returns the activity to persist with the channel's cursors.
+        """
+        now = time.time()
+        with self._lock:
+            activity = self._activity[channel_id]
+            if result is not None:
+                new_messages = result.get("new_messages", 0)
+                if activity.polled_at is not None:
+                    activity.message_rate = _ewma(activity.message_rate, new_messages / max(1.0, now - activity.polled_at))
+                if new_messages:
+                    activity.video_yield = _ewma(activity.video_yield, result.get("videos", 0) / new_messages)
+
+                if result.get("backlog"):
+                    interval = CHANNEL_POLL_MIN_SECONDS
+                elif not new_messages:
+                    interval = activity.interval * 2
+                else:
+                    interval = CHANNEL_POLL_TARGET_MESSAGES / activity.message_rate if activity.message_rate else SLEEP_AFTER_NO_MESSAGES
+                    if activity.video_yield is not None and activity.video_yield < CHANNEL_POLL_LOW_YIELD:
+                        interval *= CHANNEL_POLL_LOW_YIELD_FACTOR
+                activity.interval = min(max(interval, CHANNEL_POLL_MIN_SECONDS), CHANNEL_POLL_MAX_SECONDS)
+                activity.polled_at = now
+            # Jitter keeps channels with the same interval from being polled in lockstep.
+            activity.next_due = now + activity.interval * random.uniform(0.9, 1.1)
+            heapq.heappush(self._heap, (activity.next_due, channel_id))
+            return activity.to_dict()
+
+    def summary(self) -> str:
+        with self._lock:
+            intervals = [activity.interval for activity in self._activity.values()]
+        hot = sum(1 for interval in intervals if interval < SLEEP_AFTER_NO_MESSAGES)
+        idle = sum(1 for interval in intervals if interval >= 3600)
+        return f"{len(intervals)} channels: {hot} active, {idle} backed off to an hour or more"
@@ -23,20 +23,164 @@ DOWNLOAD_DIR = "DOWNLOAD_PATH"
 
 # File names for persistent data
 PROXIES_FILE = "proxies.txt"
-DOWNLOADED_TRACKER_FILE = "downloaded_attachments.json"
+DOWNLOADED_TRACKER_FILE = "downloaded_attachments.json" # Legacy tracker, migrated to the journal below on startup
+DOWNLOADED_JOURNAL_FILE = "downloaded_attachments.log" # Append-only tracker: one '<message_id>-<attachment_id>' per line
+TRACKER_COMPACT_SLACK = 5000 # Rewrite the journal on load once it holds this many redundant lines
 STATE_FILE = "scraper_state.json"
+PROXY_STATE_FILE = "proxy_state.json" # Latency/success scores and quarantines per proxy
+PROXY_VALIDATION_CACHE_FILE = "proxy_validation_cache.json" # Recent proxy test results, per target URL
+DOWNLOAD_PROXIES_FILE = "download_proxies.txt" # Optional separate proxy list for attachment downloads
+DOWNLOAD_PROXY_STATE_FILE = "download_proxy_state.json" # Health scores of the download proxy pool
 
 
 # === API CONSTANTS ===
 DISCORD_API_BASE = "https://discord.com/api/v9"
 MESSAGES_LIMIT = 100 # Max messages per API call
+DISCORD_EPOCH_MS = 1420070400000 # First millisecond of 2015; snowflake IDs count from here
 
 # === TIMEOUTS & RETRIES ===
 REQUEST_TIMEOUT_SECONDS = 10 # General request timeout for HTTP requests
 RETRY_AFTER_DEFAULT = 5 # Default seconds to wait if Retry-After header is missing (Discord API)
-SLEEP_AFTER_NO_MESSAGES = 300 # Seconds to sleep when no new messages are found (5 minutes)
-POLITE_API_DELAY_MIN = 1 # Minimum seconds to wait between API calls
-POLITE_API_DELAY_MAX = 3 # Maximum seconds to wait between API calls
+SLEEP_AFTER_NO_MESSAGES = 300 # Poll interval of a channel with no activity history yet (5 minutes)
+
+# === RATE LIMITING ===
+# API calls are paced by the X-RateLimit-* headers Discord returns instead of fixed sleeps.
+RATE_LIMIT_MAX_RETRIES = 5 # Times a request is retried after a 429 before giving up
+RATE_LIMIT_SAFETY_MARGIN = 0.05 # Extra seconds added to every rate-limit wait to absorb clock skew
+
+# === SCRAPER ENGINE ===
+# "threads": channel scanner and download thread pools. "asyncio": one event loop with a task per
+# channel and per download, for very large channel sets (needs httpx; see async_engine.py).
+# The asyncio engine keeps the routes' proxies and timeouts but replaces their concurrency limits
+# (API_MAX_CONCURRENT, DOWNLOAD_MAX_CONCURRENT) with the ASYNC_* ones below, always uses its own
+# httpx clients whatever HTTP_TRANSPORT says, and does not log the transport's connection summary.
+SCRAPER_ENGINE = "threads"
+ASYNC_MAX_ACTIVE_POLLS = 500 # Due channels paging at the same time; the rate-limit governor still paces API calls
+ASYNC_API_MAX_CONCURRENT = 16 # API requests in flight at once
+ASYNC_DOWNLOAD_TASKS = 32 # Attachments downloading at once
+
+# === PROXY POOL ===
+# Proxies are picked by an EWMA health score; failing ones are quarantined with exponential backoff, never deleted.
+PROXY_EWMA_ALPHA = 0.2 # Weight of the newest request in a proxy's latency/success averages
+PROXY_SOFT_FAILURE_LIMIT = 5 # Consecutive timeouts before a proxy is quarantined
+PROXY_QUARANTINE_BASE_SECONDS = 60 # First quarantine; doubles for each consecutive one
+PROXY_QUARANTINE_MAX_SECONDS = 6 * 60 * 60 # Longest quarantine
+PROXY_STATE_SAVE_INTERVAL_SECONDS = 30 # Max seconds between saves of proxy health
+
+# === HTTP TRANSPORT ===
+# Every proxy (and the direct route) keeps its own pool of keep-alive connections.
+HTTP_TRANSPORT = "auto" # "auto" (HTTP/2 via httpx if installed), "httpx", or "requests" (HTTP/1.1)
+TRANSPORT_POOL_SIZE = 10 # Max pooled connections per proxy and host
+
+# === PROXY VALIDATION ===
+# Proxies are tested in bulk before scraping (and from the GUI / `python proxy_validator.py`).
+PROXY_VALIDATE_ON_START = True # Test the proxy list when the scraper starts; failed proxies start quarantined
+PROXY_VALIDATION_URL = "https://discord.com/api/v9/gateway" # Small unauthenticated endpoint requested through each proxy
+PROXY_VALIDATION_TIMEOUT_SECONDS = 5 # A proxy slower than this to answer counts as dead
+PROXY_VALIDATION_WORKERS = 200 # Proxies tested at once
+PROXY_VALIDATION_TTL_SECONDS = 60 * 60 # Cached results younger than this are reused instead of re-testing
+
+# === NEW MESSAGE CATCH-UP ===
+# The 'after' cursor keeps paging forward until a short page arrives, so busy channels catch up
+# within one cycle. Set to 0 for no limit.
+CATCHUP_MAX_PAGES_PER_CYCLE = 20 # Max 'after' pages fetched per channel per cycle
+
+# === HISTORY BACKFILL ===
+# A 'full_scan' channel pages back through history until one of these budgets runs out,
+# then continues from the saved '{channel_id}_before' cursor next cycle. Set to 0 for no limit.
+BACKFILL_MAX_PAGES_PER_CYCLE = 50 # Max 'before' pages fetched per channel per cycle
+BACKFILL_MAX_SECONDS_PER_CYCLE = 120 # Max seconds spent backfilling one channel per cycle
+
+# === STATE CHECKPOINTS ===
+# Cursor updates in scraper_state.json are batched; a crash loses at most this much progress.
+STATE_SAVE_INTERVAL_SECONDS = 10 # Max seconds between checkpoints while scanning
+STATE_SAVE_EVERY_UPDATES = 25 # ...or checkpoint after this many cursor updates, whichever comes first
+
+# === CHANNEL POLL SCHEDULER ===
+# Each channel is polled on its own schedule, derived from its recent message rate and video yield.
+CHANNEL_POLL_MIN_SECONDS = 30 # Shortest interval; also used while a channel is behind or backfilling
+CHANNEL_POLL_MAX_SECONDS = 6 * 3600 # Longest interval a quiet channel backs off to (doubling per empty poll)
+CHANNEL_POLL_TARGET_MESSAGES = 25 # Busy channels are polled about once per this many new messages
+CHANNEL_POLL_LOW_YIELD = 0.01 # Channels with fewer videos per message than this...
+CHANNEL_POLL_LOW_YIELD_FACTOR = 4 # ...are polled this many times less often
+CHANNEL_ACTIVITY_EWMA_ALPHA = 0.3 # Weight of the latest poll in a channel's message rate and video yield
+
+# === CHANNEL SCANNERS ===
+CHANNEL_SCANNERS = 4 # Channels scanned in parallel; they share one rate-limit governor and proxy list
+
+# === DOWNLOAD WORKERS ===
+DOWNLOAD_WORKERS = 4 # Number of threads downloading attachments in parallel
+DOWNLOAD_QUEUE_SIZE = 50 # Max attachments waiting for a worker; channel paging pauses when the queue is full
+DOWNLOAD_CHUNK_SIZE = 256 * 1024 # Bytes read from the socket per iteration while streaming a download
+DOWNLOAD_MAX_ATTEMPTS = 3 # Attempts per attachment; each retry resumes the .part file with a Range request
+
+# === DOWNLOAD RETRY QUEUE ===
+# Downloads that still fail after DOWNLOAD_MAX_ATTEMPTS (or are cut short by a stop) are kept in the
+# metadata database and retried later with exponential backoff, since the channel cursor has moved on.
+RETRY_BASE_DELAY_SECONDS = 300 # Wait before the first retry; doubles with every failed round
+RETRY_MAX_DELAY_SECONDS = 6 * 3600 # Upper bound for the backoff
+RETRY_MAX_ATTEMPTS = 12 # Failed rounds before an attachment is given up on (it stays in the table for inspection)
+RETRY_POLL_INTERVAL_SECONDS = 60 # How often the retry scheduler looks for due retries
+
+# === TRAFFIC ROUTING ===
+# API paging and CDN downloads are routed separately so large transfers never tie up the API proxies.
+# A route is "proxies" or "direct"; "proxies" only applies when "Use Proxies" is ticked in the GUI.
+# Download proxies come from DOWNLOAD_PROXIES_FILE if it lists any, otherwise from the main list.
+API_ROUTE = "proxies"
+API_CONNECT_TIMEOUT_SECONDS = 5 # Seconds to establish a connection for an API call
+API_READ_TIMEOUT_SECONDS = REQUEST_TIMEOUT_SECONDS # Seconds to wait for API response data
+API_MAX_CONCURRENT = 4 # API calls in flight at once
+DOWNLOAD_ROUTE = "direct"
+DOWNLOAD_CONNECT_TIMEOUT_SECONDS = 10 # Seconds to establish a connection to the CDN
+DOWNLOAD_READ_TIMEOUT_SECONDS = 60 # Max seconds between chunks of a download before it is retried
+DOWNLOAD_MAX_CONCURRENT = DOWNLOAD_WORKERS # Attachment transfers in flight at once
+
+# === PRIORITY LANES ===
+# Downloads found by live catch-up, the retry queue and history backfill wait in separate lanes of
+# DOWNLOAD_QUEUE_SIZE each. Free workers pick lanes by weighted fair scheduling (see lanes.py), and
+# backfill paging always leaves one channel scanner free, so a history import never delays new videos.
+LANE_WEIGHTS = {"live": 6, "retry": 3, "backfill": 1}
+
+# === BANDWIDTH ===
+# Downloads are shaped by token buckets: one shared by all traffic and one per proxy. 0 means
+# unlimited. Both limits can be changed from the GUI while the scraper runs.
+BANDWIDTH_LIMIT_BYTES_PER_SECOND = 0 # Cap on total download bandwidth
+BANDWIDTH_PER_PROXY_BYTES_PER_SECOND = 0 # Cap per proxy, e.g. to stay within a provider's quota
+BANDWIDTH_PROXY_LIMITS = {} # Per-proxy overrides in bytes/s, e.g. {"http://1.2.3.4:8080": 2 * 1024 * 1024}
+BANDWIDTH_BURST_SECONDS = 1.0 # A bucket holds this many seconds of its rate, so short bursts pass unthrottled
+BANDWIDTH_METER_SECONDS = 5 # Window over which live throughput is averaged
+
+# === CDN URL REFRESH ===
+# Attachment URLs are signed and expire. Stale URLs of queued and retried downloads are re-signed
+# in batches through the API instead of refetching their message pages (see cdn_urls.py).
+CDN_URL_REFRESH_MARGIN_SECONDS = 300 # Refresh URLs that expire within this many seconds
+CDN_URL_REFRESH_BATCH_SIZE = 50 # URLs per refresh call (Discord's maximum)
+CDN_URL_REFRESH_WINDOW_SECONDS = 0.5 # How long a refresh waits for other downloads to join its batch
+
+# === METADATA DATABASE ===
+DB_WRITE_BATCH_SIZE = 200 # Max metadata writes committed together
+DB_WRITE_BATCH_SECONDS = 0.5 # Max seconds a queued metadata write waits for its batch to commit
+
+# === DEDUPLICATION ===
+# Every download is hashed (SHA-256) while it streams; reposts of a stored video are recorded
+# as references to it instead of being kept twice.
+PARTIAL_HASH_BYTES = 64 * 1024 # Leading bytes hashed to recognize a repost before downloading it
+
+# === POST-DOWNLOAD PROBING ===
+PROBE_WORKERS = 2 # Processes reading container headers to sort downloads by audio track
+SNIFF_MAX_BYTES = 4 * 1024 * 1024 # Bytes buffered while looking for track info in a download's first chunks
+
+# === NEAR-DUPLICATE DETECTION ===
+# Keyframe hashes (needs ffmpeg) flag re-encoded or trimmed copies; the gallery collapses them under the original.
+FINGERPRINT_WORKERS = 1 # Processes decoding keyframes; each runs ffmpeg, so keep this low
+FINGERPRINT_SAMPLES = 8 # Keyframes hashed per video, spread evenly over its duration
+FINGERPRINT_MAX_DISTANCE = 10 # Max differing bits (of 64) for two keyframes to count as the same picture
+FINGERPRINT_MIN_MATCHING_FRAMES = 4 # Keyframes that must match before two videos are called near-duplicates
+FINGERPRINT_BACKLOG_PER_RUN = 500 # Previously downloaded videos fingerprinted each time the scraper starts
+
+# === HTML GALLERY ===
+HTML_INDEX_DEBOUNCE_SECONDS = 5 # Rebuild the gallery once downloads have been quiet this long
+HTML_INDEX_MAX_DELAY_SECONDS = 60 # ...but never postpone a pending rebuild longer than this
 
 # === PROXY LIST (Example - will be overridden by proxies.txt or GUI input) ===
 # It's recommended to periodically test and update your proxy list for reliability.
@@ -0,0 +1,173 @@
+# fingerprint.py
+"""
+Perceptual fingerprints for spotting re-encoded, trimmed or re-uploaded copies of a video.
+
+A few keyframes spread across the video are decoded by ffmpeg straight to 9x8 grayscale
+and reduced to 64-bit difference hashes (dHash). Re-encoding or a new bitrate barely moves
+these hashes, so copies are found by Hamming distance with a BK-tree. fingerprint_file is a
+plain top-level function so it can run inside a ProcessPoolExecutor.
+"""
+import shutil
+import logging
+import subprocess
+import threading
+from typing import NamedTuple, Optional
+
+from media_probe import probe_file
+
+try:
+    import imageio_ffmpeg # Optional: ships an ffmpeg binary alongside moviepy
+except ImportError:
+    imageio_ffmpeg = None
+
+HASH_WIDTH, HASH_HEIGHT = 9, 8
+# Frames this flat (black/white/fades) hash to near zero and would match everything.
+MIN_FRAME_CONTRAST = 16
+
+
+class FingerprintResult(NamedTuple):
+    hashes: list
+    error: Optional[str] = None
+
+
+def find_ffmpeg() -> Optional[str]:
+    """Returns the ffmpeg executable to use, or None if there is none."""
+    path = shutil.which("ffmpeg")
+    if path is None and imageio_ffmpeg is not None:
+        try:
+            path = imageio_ffmpeg.get_ffmpeg_exe()
+        except Exception:
+            path = None
+    return path
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def dhash(pixels: bytes) -> Optional[int]:
+    """Hashes a 9x8 grayscale frame: one bit per pixel, set when it is brighter than its right neighbour."""
+    if max(pixels) - min(pixels) < MIN_FRAME_CONTRAST:
+        return None
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for col in range(HASH_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _grab_keyframe(ffmpeg: str, path: str, position: float) -> Optional[bytes]:
+    """Decodes the keyframe at or before `position` seconds, scaled down to the hash size."""
+    # Without accurate seeking ffmpeg stops at the keyframe it seeks to instead of decoding up to `position`.
+    command = [
+        ffmpeg, "-v", "error", "-noaccurate_seek", "-ss", f"{position:.3f}", "-i", path,
+        "-frames:v", "1", "-vf", f"scale={HASH_WIDTH}:{HASH_HEIGHT}:flags=area,format=gray",
+        "-f", "rawvideo", "-",
+    ]
+    completed = subprocess.run(command, capture_output=True, timeout=60)
+    frame = completed.stdout[:HASH_WIDTH * HASH_HEIGHT]
+    return frame if len(frame) == HASH_WIDTH * HASH_HEIGHT else None
+
+
+def fingerprint_file(path: str, duration: float = None, samples: int = 8) -> FingerprintResult:
+    """Hashes `samples` keyframes spread evenly over a video. Safe to call in a worker process."""
+    try:
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None:
+            return FingerprintResult([], "ffmpeg not found")
+        if not duration:
+            duration = probe_file(path).duration
+        positions = [duration * (i + 0.5) / samples for i in range(samples)] if duration else [0.0]
+
+        hashes = []
+        for position in positions:
+            frame = _grab_keyframe(ffmpeg, path, position)
+            value = dhash(frame) if frame else None
+            if value is not None and value not in hashes:
+                hashes.append(value)
+        return FingerprintResult(hashes)
+    except Exception as e:
+        logging.debug(f"Fingerprinting {path} failed: {e}")
+        return FingerprintResult([], str(e))
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes for Hamming-radius queries without scanning every entry."""
+
+    def __init__(self):
+        # Each node is [hash, keys, {distance: child}].
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, key):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list:
+        """Returns (distance, key) for every stored hash within max_distance of value."""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, key) for key in node[1])
+            # Triangle inequality: only children in this distance band can hold matches.
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return results
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index of every fingerprinted video. A video is a near-duplicate of an earlier one
+    when enough of its keyframes land within max_distance of that video's keyframes.
+    """
+
+    def __init__(self, max_distance: int, min_matching_frames: int):
+        self.max_distance = max_distance
+        self.min_matching_frames = min_matching_frames
+        self.tree = BKTree()
+        # Near-duplicates point at the video they copy, so matches always resolve to the original.
+        self.originals = {}
+        self.lock = threading.Lock()
+
+    def add(self, filename: str, hashes: list, near_duplicate_of: str = None):
+        with self.lock:
+            if near_duplicate_of:
+                self.originals[filename] = self.originals.get(near_duplicate_of, near_duplicate_of)
+            for value in hashes:
+                self.tree.add(value, filename)
+
+    def find_match(self, hashes: list) -> Optional[str]:
+        """
+        Returns the original video this fingerprint matches, or None. Fingerprints with fewer than
+        min_matching_frames distinct keyframes (static or very short clips) never match: one or two
+        plain frames say too little to skip a video as a copy.
+        """
+        distinct = set(hashes)
+        if len(distinct) < self.min_matching_frames:
+            return None
+        matched_frames = {}
+        with self.lock:
+            for value in distinct:
+                # Count each query frame at most once per original.
+                for original in {self.originals.get(key, key) for _, key in self.tree.search(value, self.max_distance)}:
+                    matched_frames[original] = matched_frames.get(original, 0) + 1
+        best = max(matched_frames.items(), key=lambda item: item[1], default=None)
+        return best[0] if best and best[1] >= self.min_matching_frames else None
@@ -8,17 +8,19 @@ import logging
 import re
 import json
 
-from config import DEFAULT_TOKEN, DOWNLOAD_DIR, PROXIES_FILE
-from scraper_logic import ScraperLogic
+from config import DEFAULT_TOKEN, DOWNLOAD_DIR, PROXIES_FILE, BANDWIDTH_LIMIT_BYTES_PER_SECOND, BANDWIDTH_PER_PROXY_BYTES_PER_SECOND
+from async_engine import select_engine
 from utils import load_proxies_from_file, save_proxies_to_file, load_downloaded_attachments
+from proxy_validator import validate_proxies
 
 USER_SETTINGS_FILE = "user_settings.json"
+BYTES_PER_MB = 1024 * 1024
 
 class ScraperGUI:
     def __init__(self, master):
         self.master = master
         master.title("Discord Video Scraper")
-        master.geometry("700x720")
+        master.geometry("700x790")
         master.resizable(False, False)
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -121,6 +123,20 @@ class ScraperGUI:
         self.save_proxies_button.pack(side=tk.LEFT, padx=(0,5))
         self.load_proxies_button = ttk.Button(proxy_button_frame, text="Load Proxies from File", command=self._load_proxies_from_file_manual)
         self.load_proxies_button.pack(side=tk.LEFT)
+        self.validate_proxies_button = ttk.Button(proxy_button_frame, text="Validate Proxies", command=self._validate_proxies)
+        self.validate_proxies_button.pack(side=tk.LEFT, padx=(5,0))
+
+        bandwidth_frame = ttk.LabelFrame(main_frame, text="Bandwidth (MB/s, 0 = unlimited)", padding="10")
+        bandwidth_frame.pack(pady=5, fill=tk.X)
+        ttk.Label(bandwidth_frame, text="Total:").pack(side=tk.LEFT)
+        self.bandwidth_total_entry = ttk.Entry(bandwidth_frame, width=8)
+        self.bandwidth_total_entry.pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Label(bandwidth_frame, text="Per Proxy:").pack(side=tk.LEFT)
+        self.bandwidth_proxy_entry = ttk.Entry(bandwidth_frame, width=8)
+        self.bandwidth_proxy_entry.pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Button(bandwidth_frame, text="Apply", command=self._apply_bandwidth_limits).pack(side=tk.LEFT)
+        self.throughput_label = ttk.Label(bandwidth_frame, text="Throughput: -")
+        self.throughput_label.pack(side=tk.RIGHT)
 
         bottom_frame = ttk.Frame(main_frame)
         bottom_frame.pack(fill=tk.X, pady=5)
@@ -158,6 +174,8 @@ class ScraperGUI:
         if proxies_text:
             self.proxy_text.insert(tk.END, proxies_text)
         self._toggle_proxy_input()
+        self.bandwidth_total_entry.insert(0, settings.get('bandwidth_total_mbps', BANDWIDTH_LIMIT_BYTES_PER_SECOND / BYTES_PER_MB))
+        self.bandwidth_proxy_entry.insert(0, settings.get('bandwidth_per_proxy_mbps', BANDWIDTH_PER_PROXY_BYTES_PER_SECOND / BYTES_PER_MB))
         
         try:
             initial_downloads = load_downloaded_attachments()
@@ -170,7 +188,9 @@ class ScraperGUI:
             'last_download_dir': self.download_dir_entry.get(),
             'channels': self.channel_data, # Save the list of dictionaries
             'use_proxies': self.use_proxies_var.get(),
-            'last_proxies': self.proxy_text.get(1.0, tk.END).strip()
+            'last_proxies': self.proxy_text.get(1.0, tk.END).strip(),
+            'bandwidth_total_mbps': self.bandwidth_total_entry.get().strip(),
+            'bandwidth_per_proxy_mbps': self.bandwidth_proxy_entry.get().strip()
         }
         try:
             with open(USER_SETTINGS_FILE, 'w') as f: json.dump(settings, f, indent=4)
@@ -196,8 +216,11 @@ class ScraperGUI:
         
         use_proxies = self.use_proxies_var.get()
         proxy_list = self.proxy_text.get(1.0, tk.END).strip().split('\n')
+        bandwidth_limits = self._read_bandwidth_limits()
+        if bandwidth_limits is None: return
         
-        self.scraper_logic = ScraperLogic(token, full_scan_channels, new_only_channels, download_dir, use_proxies, [p for p in proxy_list if p], self.gui_queue)
+        self.scraper_logic = select_engine()(token, full_scan_channels, new_only_channels, download_dir, use_proxies, [p for p in proxy_list if p], self.gui_queue)
+        self.scraper_logic.bandwidth.set_limits(*bandwidth_limits)
         self.scraper_thread = threading.Thread(target=self.scraper_logic.run, daemon=True)
         self.scraper_thread.start()
 
@@ -206,6 +229,34 @@ class ScraperGUI:
         self.stop_button.config(state=tk.NORMAL)
         self.progress_bar.pack(fill=tk.X, pady=5)
         self.progress_bar.start()
+        self._refresh_throughput()
+
+    def _read_bandwidth_limits(self):
+        """Returns (total, per proxy) limits in bytes/s from the entry fields, or None after showing an error."""
+        try:
+            total = float(self.bandwidth_total_entry.get().strip() or 0)
+            per_proxy = float(self.bandwidth_proxy_entry.get().strip() or 0)
+        except ValueError:
+            total = per_proxy = -1
+        if total < 0 or per_proxy < 0:
+            messagebox.showerror("Input Error", "Bandwidth limits must be numbers of MB/s (0 = unlimited).")
+            return None
+        return total * BYTES_PER_MB, per_proxy * BYTES_PER_MB
+
+    def _apply_bandwidth_limits(self):
+        bandwidth_limits = self._read_bandwidth_limits()
+        if bandwidth_limits is None: return
+        if self.scraper_logic and self.scraper_thread.is_alive():
+            self.scraper_logic.bandwidth.set_limits(*bandwidth_limits)
+        self.status_label.config(text="Status: Bandwidth limits applied.")
+
+    def _refresh_throughput(self):
+        """Shows live download throughput once a second while the scraper runs."""
+        if not (self.scraper_logic and self.scraper_thread.is_alive()):
+            self.throughput_label.config(text="Throughput: -")
+            return
+        self.throughput_label.config(text=f"Throughput: {self.scraper_logic.bandwidth.summary()}")
+        self.master.after(1000, self._refresh_throughput)
 
     # <<< NEW HELPER: Refreshes the listbox based on the self.channel_data list
     def _refresh_channel_listbox(self):
@@ -294,6 +345,8 @@ class ScraperGUI:
                     self.status_label.config(text=f"Status: {message['status']}")
                 if "count" in message:
                     self.download_count_label.config(text=f"Total Downloaded: {message['count']}")
+                if "validated_proxies" in message:
+                    self._show_validated_proxies(message["validated_proxies"])
                 if message.get("status") == "Scraper Stopped.":
                     if self.is_closing: self.master.destroy()
                     else:
@@ -318,6 +371,7 @@ class ScraperGUI:
         self.proxy_text.config(state=state)
         self.save_proxies_button.config(state=state)
         self.load_proxies_button.config(state=state)
+        self.validate_proxies_button.config(state=state)
         
     def _save_proxies_to_file(self):
         proxies_to_save = self.proxy_text.get(1.0, tk.END).strip().split('\n')
@@ -330,6 +384,35 @@ class ScraperGUI:
         for proxy in proxies: self.proxy_text.insert(tk.END, proxy + "\n")
         messagebox.showinfo("Success", f"Loaded {len(proxies)} proxies from proxies.txt.")
 
+    def _validate_proxies(self):
+        proxies = [p for p in self.proxy_text.get(1.0, tk.END).strip().split('\n') if p.strip()]
+        if not proxies:
+            messagebox.showerror("Input Error", "The proxy list is empty.")
+            return
+        self.validate_proxies_button.config(state=tk.DISABLED)
+        def progress(done, total):
+            if done % 50 == 0 or done == total:
+                self.gui_queue.put({"status": f"Validating proxies: {done}/{total} tested..."})
+        def worker():
+            try:
+                checks = validate_proxies(proxies, progress=progress)
+            except Exception as e:
+                logging.error(f"Proxy validation failed: {e}")
+                checks = None
+            self.gui_queue.put({"status": "Proxy validation finished.", "validated_proxies": checks})
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _show_validated_proxies(self, checks):
+        """Replaces the proxy box with the working proxies, fastest first, so the scraper starts from a ranked list."""
+        self.validate_proxies_button.config(state=tk.NORMAL if self.use_proxies_var.get() else tk.DISABLED)
+        if checks is None:
+            messagebox.showerror("Validation Failed", "Could not validate the proxies. Check console/logs.")
+            return
+        working = [check.proxy for check in checks if check.ok]
+        self.proxy_text.delete(1.0, tk.END)
+        for proxy in working: self.proxy_text.insert(tk.END, proxy + "\n")
+        messagebox.showinfo("Validation Complete", f"{len(working)} of {len(checks)} proxies work. Failed proxies were removed from the list.")
+
     def _pause_scraper(self):
         if self.scraper_logic and self.scraper_thread.is_alive():
             self.scraper_logic.paused = not self.scraper_logic.paused
@@ -0,0 +1,107 @@
+# lanes.py
+"""
+Priority lanes for download work. Attachments found by live catch-up, by the retry queue and by
+history backfill wait in separate bounded FIFOs, and each free worker takes its next item from
+a lane chosen by smooth weighted round-robin over the lanes that have work. With weights
+6/3/1, live downloads get six of every ten free worker slots while all three lanes are busy,
+and any lane can use every worker when the others are empty. Each lane has its own bound,
+so a full backfill lane only slows backfill paging, never live catch-up.
+"""
+import queue
+import asyncio
+import threading
+import collections
+
+from config import LANE_WEIGHTS
+
+LIVE_LANE = "live"
+RETRY_LANE = "retry"
+BACKFILL_LANE = "backfill"
+
+
+class _WeightedPicker:
+    """Smooth weighted round-robin: interleaves lanes in proportion to their weights, without bursts."""
+
+    def __init__(self):
+        self._current = {lane: 0 for lane in LANE_WEIGHTS}
+
+    def pick(self, ready: list) -> str:
+        total = sum(LANE_WEIGHTS[lane] for lane in ready)
+        for lane in ready:
+            self._current[lane] += LANE_WEIGHTS[lane]
+        chosen = max(ready, key=self._current.__getitem__)
+        self._current[chosen] -= total
+        return chosen
+
+
+class LaneQueue:
+    """Thread-safe lane queue with the put/get/get_nowait/qsize subset of queue.Queue."""
+
+    def __init__(self, maxsize_per_lane: int):
+        self.maxsize = maxsize_per_lane
+        self._lanes = {lane: collections.deque() for lane in LANE_WEIGHTS}
+        self._picker = _WeightedPicker()
+        self._not_empty = threading.Condition()
+        self._not_full = threading.Condition(self._not_empty._lock)
+
+    def put(self, lane: str, item, timeout: float = None):
+        """Adds an item to a lane, waiting while that lane is full. Raises queue.Full on timeout."""
+        with self._not_full:
+            if not self._not_full.wait_for(lambda: len(self._lanes[lane]) < self.maxsize, timeout):
+                raise queue.Full
+            self._lanes[lane].append(item)
+            self._not_empty.notify()
+
+    def get(self, timeout: float = None):
+        """Takes the next item by weighted fair choice among non-empty lanes. Raises queue.Empty on timeout."""
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: any(self._lanes.values()), timeout):
+                raise queue.Empty
+            return self._take()
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def _take(self):
+        lane = self._picker.pick([lane for lane, items in self._lanes.items() if items])
+        item = self._lanes[lane].popleft()
+        self._not_full.notify_all()
+        return item
+
+    def qsize(self, lane: str = None) -> int:
+        with self._not_empty:
+            return len(self._lanes[lane]) if lane else sum(len(items) for items in self._lanes.values())
+
+
+class AsyncLaneQueue:
+    """The same lanes for the asyncio engine; put() and get() are coroutines."""
+
+    def __init__(self, maxsize_per_lane: int):
+        self.maxsize = maxsize_per_lane
+        self._lanes = {lane: collections.deque() for lane in LANE_WEIGHTS}
+        self._picker = _WeightedPicker()
+        self._changed = asyncio.Condition()
+
+    async def put(self, lane: str, item):
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self._lanes[lane]) < self.maxsize)
+            self._lanes[lane].append(item)
+            self._changed.notify_all()
+
+    async def get(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: any(self._lanes.values()))
+            lane = self._picker.pick([lane for lane, items in self._lanes.items() if items])
+            item = self._lanes[lane].popleft()
+            self._changed.notify_all()
+            return item
+
+    def get_nowait(self):
+        """Takes any queued item, or raises queue.Empty. For draining after the tasks have stopped."""
+        for items in self._lanes.values():
+            if items:
+                return items.popleft()
+        raise queue.Empty
+
+    def qsize(self, lane: str = None) -> int:
+        return len(self._lanes[lane]) if lane else sum(len(items) for items in self._lanes.values())
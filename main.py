@@ -3,11 +3,13 @@ import tkinter as tk
 from gui import ScraperGUI
 import logging
 import os
-from config import DEFAULT_TOKEN, PROXIES_FILE, DOWNLOADED_TRACKER_FILE, DEFAULT_PROXY_LIST
-from utils import save_proxies_to_file, save_downloaded_attachments, init_database # <<< ADD init_database
+from config import DEFAULT_TOKEN, PROXIES_FILE, DOWNLOADED_JOURNAL_FILE, DEFAULT_PROXY_LIST
+from utils import save_proxies_to_file, save_downloaded_attachments, init_database, migrate_downloaded_tracker
+from metadata_store import get_metadata_store
 
 # Configure logging for the entire application
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger("httpx").setLevel(logging.WARNING) # httpx logs every request at INFO
 
 def main():
     """Main function to initialize and run the Discord Scraper GUI application."""
@@ -30,13 +32,14 @@ def main():
         logging.error(f"Failed to ensure '{PROXIES_FILE}' exists or is initialized: {e}")
 
     try:
-        if not os.path.exists(DOWNLOADED_TRACKER_FILE):
+        migrate_downloaded_tracker()
+        if not os.path.exists(DOWNLOADED_JOURNAL_FILE):
             save_downloaded_attachments(set())
-            logging.info(f"Created empty '{DOWNLOADED_TRACKER_FILE}'.")
+            logging.info(f"Created empty '{DOWNLOADED_JOURNAL_FILE}'.")
         else:
-            logging.info(f"'{DOWNLOADED_TRACKER_FILE}' already exists.")
+            logging.info(f"'{DOWNLOADED_JOURNAL_FILE}' already exists.")
     except Exception as e:
-        logging.error(f"Failed to ensure '{DOWNLOADED_TRACKER_FILE}' exists or is initialized: {e}")
+        logging.error(f"Failed to ensure '{DOWNLOADED_JOURNAL_FILE}' exists or is initialized: {e}")
     
     if not DEFAULT_TOKEN:
         logging.warning("Discord TOKEN is empty. Please update config.py or enter it in the GUI.")
@@ -48,6 +51,7 @@ def main():
     root = tk.Tk()
     app = ScraperGUI(root)
     root.mainloop()
+    get_metadata_store().close()
     logging.info("Scraper GUI closed. Application exiting.")
 
 if __name__ == "__main__":
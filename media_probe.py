@@ -0,0 +1,322 @@
+# media_probe.py
+"""
+Lightweight audio/video track detection that reads container headers directly.
+
+Only the MP4 'moov' box or the Matroska/WebM 'Info' and 'Tracks' elements are read,
+so probing a file costs a few small reads instead of starting ffmpeg. Everything here
+is a plain top-level function so it can run inside a ProcessPoolExecutor.
+"""
+import io
+import os
+import struct
+import logging
+from typing import NamedTuple, Optional
+
+try:
+    from moviepy import VideoFileClip # Optional: only used for containers we cannot parse ourselves
+except ImportError:
+    VideoFileClip = None
+
+
+class ProbeResult(NamedTuple):
+    valid: bool
+    has_audio: Optional[bool] = None
+    has_video: Optional[bool] = None
+    duration: Optional[float] = None
+    container: Optional[str] = None
+    error: Optional[str] = None
+
+
+class _Truncated(Exception):
+    """Raised when the data ends before a structure we need is complete."""
+
+
+class _Reader:
+    def __init__(self, f, size: int, partial: bool = False):
+        self.f = f
+        self.size = size
+        # True while sniffing a download in progress: running out of data means "wait for more".
+        self.partial = partial
+
+    def tell(self) -> int:
+        return self.f.tell()
+
+    def seek(self, offset: int):
+        if offset > self.size:
+            raise _Truncated(f"offset {offset} is past the end of the data ({self.size} bytes)")
+        self.f.seek(offset)
+
+    def read_exact(self, n: int) -> bytes:
+        data = self.f.read(n)
+        if len(data) != n:
+            raise _Truncated(f"wanted {n} bytes, got {len(data)}")
+        return data
+
+
+# --- MP4 / ISO BMFF ---
+_MP4_BRAND_BOXES = {b"ftyp", b"styp"}
+_MP4_CONTAINER_BOXES = {b"trak", b"mdia", b"minf", b"edts", b"udta"}
+
+def _iter_mp4_boxes(data: bytes, start: int = 0, end: int = None):
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise _Truncated("largesize header cut off")
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"box '{box_type.decode('latin-1')}' has an invalid size")
+        yield box_type, data[pos + header:pos + size]
+        pos += size
+
+def _parse_mp4_moov(moov: bytes) -> ProbeResult:
+    has_audio = has_video = False
+    duration = None
+    for box_type, payload in _iter_mp4_boxes(moov):
+        if box_type == b"mvhd" and len(payload) >= 20:
+            if payload[0] == 1 and len(payload) >= 32:
+                timescale, length = struct.unpack(">IQ", payload[20:32])
+            else:
+                timescale, length = struct.unpack(">II", payload[12:20])
+            if timescale:
+                duration = length / timescale
+        elif box_type == b"trak":
+            handler = _find_mp4_handler(payload)
+            has_audio = has_audio or handler == b"soun"
+            has_video = has_video or handler == b"vide"
+    return ProbeResult(valid=has_audio or has_video, has_audio=has_audio, has_video=has_video,
+                       duration=duration, container="mp4", error=None if has_audio or has_video else "no tracks in moov")
+
+def _find_mp4_handler(trak: bytes):
+    for box_type, payload in _iter_mp4_boxes(trak):
+        if box_type == b"hdlr" and len(payload) >= 12:
+            return payload[8:12]
+        if box_type in _MP4_CONTAINER_BOXES:
+            handler = _find_mp4_handler(payload)
+            if handler:
+                return handler
+    return None
+
+def _probe_mp4(reader: _Reader) -> ProbeResult:
+    """Walks the top-level boxes, seeking over media data, until 'moov' is found."""
+    pos = 0
+    while pos < reader.size:
+        reader.seek(pos)
+        header = reader.read_exact(8)
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", reader.read_exact(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = reader.size - pos
+        if size < header_size:
+            return ProbeResult(valid=False, container="mp4", error=f"invalid size for box '{box_type.decode('latin-1')}'")
+        if box_type == b"moov":
+            return _parse_mp4_moov(reader.read_exact(size - header_size))
+        if pos + size > reader.size:
+            raise _Truncated(f"box '{box_type.decode('latin-1')}' runs past the end of the data")
+        pos += size
+    if reader.partial:
+        raise _Truncated("moov not received yet")
+    return ProbeResult(valid=False, container="mp4", error="no moov box")
+
+
+# --- Matroska / WebM (EBML) ---
+_EBML_HEADER = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_TRACKS = 0x1654AE6B
+_TRACK_ENTRY = 0xAE
+_TRACK_TYPE = 0x83
+_CLUSTER = 0x1F43B675
+_UNKNOWN_SIZE = -1
+
+def _read_vint(reader: _Reader, keep_marker: bool):
+    first = reader.read_exact(1)[0]
+    if first == 0:
+        raise ValueError("invalid EBML variable-length integer")
+    length = 1
+    mask = 0x80
+    while not first & mask:
+        mask >>= 1
+        length += 1
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = (first & (mask - 1)) == mask - 1
+    for byte in reader.read_exact(length - 1):
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if not keep_marker and all_ones:
+        return _UNKNOWN_SIZE
+    return value
+
+def _read_element_header(reader: _Reader):
+    element_id = _read_vint(reader, keep_marker=True)
+    size = _read_vint(reader, keep_marker=False)
+    return element_id, size
+
+def _iter_ebml_children(reader: _Reader, end: int):
+    while reader.tell() < end:
+        element_id, size = _read_element_header(reader)
+        data_start = reader.tell()
+        yield element_id, size, data_start
+        if size == _UNKNOWN_SIZE:
+            return
+        reader.seek(data_start + size)
+
+def _read_uint(data: bytes) -> int:
+    return int.from_bytes(data, "big") if data else 0
+
+def _probe_ebml(reader: _Reader) -> ProbeResult:
+    element_id, size = _read_element_header(reader)
+    if element_id != _EBML_HEADER or size == _UNKNOWN_SIZE:
+        return ProbeResult(valid=False, container="webm", error="missing EBML header")
+    reader.seek(reader.tell() + size)
+
+    element_id, segment_size = _read_element_header(reader)
+    if element_id != _SEGMENT:
+        return ProbeResult(valid=False, container="webm", error="missing Segment element")
+    segment_end = reader.size if segment_size == _UNKNOWN_SIZE else reader.tell() + segment_size
+    if segment_end > reader.size and not reader.partial:
+        raise _Truncated("segment runs past the end of the data")
+
+    timecode_scale = 1_000_000
+    raw_duration = None
+    track_types = None
+    for element_id, size, data_start in _iter_ebml_children(reader, segment_end):
+        if element_id == _INFO and size != _UNKNOWN_SIZE:
+            for child_id, child_size, child_start in _iter_ebml_children(reader, data_start + size):
+                if child_size == _UNKNOWN_SIZE:
+                    break
+                if child_id == _TIMECODE_SCALE:
+                    timecode_scale = _read_uint(reader.read_exact(child_size)) or timecode_scale
+                elif child_id == _DURATION and child_size in (4, 8):
+                    raw_duration = struct.unpack(">f" if child_size == 4 else ">d", reader.read_exact(child_size))[0]
+        elif element_id == _TRACKS and size != _UNKNOWN_SIZE:
+            track_types = []
+            for entry_id, entry_size, entry_start in _iter_ebml_children(reader, data_start + size):
+                if entry_id != _TRACK_ENTRY or entry_size == _UNKNOWN_SIZE:
+                    continue
+                for child_id, child_size, child_start in _iter_ebml_children(reader, entry_start + entry_size):
+                    if child_id == _TRACK_TYPE and child_size != _UNKNOWN_SIZE:
+                        track_types.append(_read_uint(reader.read_exact(child_size)))
+                        break
+        elif element_id == _CLUSTER:
+            # Media data starts here; the track list always precedes the first cluster in practice.
+            break
+        if track_types is not None and raw_duration is not None:
+            break
+
+    if track_types is None:
+        if reader.partial and reader.tell() >= reader.size:
+            raise _Truncated("Tracks not received yet")
+        return ProbeResult(valid=False, container="webm", error="no Tracks element before media data")
+    duration = raw_duration * timecode_scale / 1e9 if raw_duration is not None else None
+    has_audio, has_video = 2 in track_types, 1 in track_types
+    return ProbeResult(valid=has_audio or has_video, has_audio=has_audio, has_video=has_video,
+                       duration=duration, container="webm", error=None if has_audio or has_video else "no audio or video tracks")
+
+
+# --- Entry points ---
+def _probe_bytes(data: bytes, partial: bool) -> Optional[ProbeResult]:
+    container = detect_container(bytes(data[:16]))
+    reader = _Reader(io.BytesIO(data), len(data), partial=partial)
+    if container == "mp4":
+        return _probe_mp4(reader)
+    if container == "webm":
+        return _probe_ebml(reader)
+    return None
+
+
+class StreamingSniffer:
+    """
+    Buffers the start of a download and decides its tracks as soon as the container headers
+    have arrived, so the file can be written straight into its category folder.
+
+    feed() returns True once the sniffer is done: either `result` holds a decision, or the
+    headers were not found within `max_bytes` (e.g. an MP4 with 'moov' at the end), in which
+    case `result` stays None and the file must be probed after the download.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.result = None
+        self.done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.done:
+            return True
+        self.buffer += chunk
+        if len(self.buffer) >= 16 and detect_container(bytes(self.buffer[:16])) is None:
+            self.done = True
+            return True
+        try:
+            result = _probe_bytes(self.buffer, partial=True)
+        except _Truncated:
+            self.done = len(self.buffer) >= self.max_bytes
+            return self.done
+        except Exception as e:
+            logging.debug(f"Streaming sniff gave up: {e}")
+            result = None
+        # Only trust a positive answer mid-stream; judging corruption is left to the full-file probe.
+        self.result = result if result is not None and result.valid else None
+        self.done = True
+        return True
+
+    def finish(self) -> Optional[ProbeResult]:
+        """Called when the whole file fit in the buffer: the buffer is the complete file."""
+        self.done = True
+        if self.result is None:
+            try:
+                self.result = _probe_bytes(self.buffer, partial=False)
+            except _Truncated as e:
+                self.result = ProbeResult(valid=False, error=f"truncated file: {e}")
+            except Exception as e:
+                self.result = ProbeResult(valid=False, error=str(e))
+        return self.result
+
+    def take_buffer(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer = bytearray()
+        return data
+
+def detect_container(head: bytes) -> Optional[str]:
+    if len(head) >= 8 and head[4:8] in _MP4_BRAND_BOXES | {b"moov", b"mdat", b"free", b"wide", b"skip"}:
+        return "mp4"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    return None
+
+def _probe_with_moviepy(path: str) -> ProbeResult:
+    with VideoFileClip(path) as clip:
+        return ProbeResult(valid=True, has_audio=clip.audio is not None, has_video=True, duration=clip.duration, container="other")
+
+def probe_file(path: str) -> ProbeResult:
+    """Reads a downloaded file's container headers. Safe to call in a worker process."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            container = detect_container(f.read(16))
+            f.seek(0)
+            reader = _Reader(f, size)
+            if container == "mp4":
+                return _probe_mp4(reader)
+            if container == "webm":
+                return _probe_ebml(reader)
+        if VideoFileClip is not None:
+            return _probe_with_moviepy(path)
+        return ProbeResult(valid=True, container=None, error="unrecognized container")
+    except _Truncated as e:
+        return ProbeResult(valid=False, error=f"truncated file: {e}")
+    except Exception as e:
+        logging.debug(f"Probe of {path} failed: {e}")
+        return ProbeResult(valid=False, error=str(e))
@@ -0,0 +1,133 @@
+# metadata_store.py
+import os
+import queue
+import sqlite3
+import logging
+import threading
+import time
+
+from config import DOWNLOAD_DIR, DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_SECONDS
+
+# Database file path is now built using your config
+DATABASE_FILE = os.path.join(DOWNLOAD_DIR, "sql_database", "metadata.db")
+
+_STOP = object()
+
+
+class MetadataStore:
+    """
+    Long-lived access to the metadata database.
+
+    All writes go through a queue to a single writer connection, which commits them in
+    batches of up to DB_WRITE_BATCH_SIZE statements or DB_WRITE_BATCH_SECONDS, whichever
+    comes first. The database runs in WAL mode, so readers (one connection per thread)
+    never wait for the writer.
+    """
+
+    def __init__(self, database_file: str = DATABASE_FILE):
+        self.database_file = database_file
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.database_file), exist_ok=True)
+        con = sqlite3.connect(self.database_file, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints, which is safe against application crashes.
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.row_factory = sqlite3.Row
+        return con
+
+    # --- Writes ---
+    def execute(self, sql: str, params=()):
+        """Queues one statement for the writer thread."""
+        self._ensure_writer()
+        self._queue.put((sql, params, False))
+
+    def executemany(self, sql: str, seq_of_params):
+        self._ensure_writer()
+        self._queue.put((sql, list(seq_of_params), True))
+
+    def flush(self):
+        """Blocks until every queued write has been committed."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        with self._writer_lock:
+            if self._writer is None:
+                return
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="metadata-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        con = self.connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + DB_WRITE_BATCH_SECONDS
+            while len(batch) < DB_WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                for sql, params, many in batch:
+                    try:
+                        if many:
+                            con.executemany(sql, params)
+                        else:
+                            con.execute(sql, params)
+                    except sqlite3.Error as e:
+                        logging.error(f"Metadata write failed ({e}): {sql.strip().splitlines()[0]}")
+                con.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Failed to commit metadata batch of {len(batch)} writes: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        con.close()
+
+    # --- Reads ---
+    def query(self, sql: str, params=()) -> list:
+        """Runs a read on this thread's own connection; WAL readers do not block on the writer."""
+        con = getattr(self._local, "connection", None)
+        if con is None:
+            con = self._local.connection = self.connect()
+        return con.execute(sql, params).fetchall()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_metadata_store() -> MetadataStore:
+    """Returns the process-wide store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataStore()
+        return _store
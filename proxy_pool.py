@@ -0,0 +1,159 @@
+# proxy_pool.py
+import json
+import time
+import random
+import logging
+import threading
+
+from config import (
+    PROXY_STATE_FILE, PROXY_EWMA_ALPHA, PROXY_SOFT_FAILURE_LIMIT,
+    PROXY_QUARANTINE_BASE_SECONDS, PROXY_QUARANTINE_MAX_SECONDS, PROXY_STATE_SAVE_INTERVAL_SECONDS
+)
+from utils import atomic_write_text, normalize_proxy_url
+
+
+class _ProxyHealth:
+    __slots__ = ("latency", "success_rate", "soft_failures", "strikes", "quarantined_until")
+
+    def __init__(self, latency=None, success_rate=1.0, soft_failures=0, strikes=0, quarantined_until=0.0):
+        self.latency = latency                      # EWMA of seconds until response headers, None until measured
+        self.success_rate = success_rate            # EWMA of 1 (success) / 0 (failure)
+        self.soft_failures = soft_failures          # consecutive timeouts since the last success
+        self.strikes = strikes                      # consecutive quarantines; doubles the next one
+        self.quarantined_until = quarantined_until  # wall-clock time, so quarantines survive a restart
+
+
+class ProxyPool:
+    """
+    Picks proxies in proportion to their health instead of round-robin.
+
+    Every request feeds an EWMA of the proxy's latency and success rate, and a proxy's
+    share of traffic is success_rate^2 / latency. Failing proxies are quarantined with
+    exponential backoff rather than deleted, so a transient outage costs a proxy a few
+    minutes instead of its place in the list. Health is saved to PROXY_STATE_FILE at
+    most every PROXY_STATE_SAVE_INTERVAL_SECONDS. Shared by every thread that sends requests.
+    """
+
+    def __init__(self, proxies: list[str], state_file: str = PROXY_STATE_FILE):
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._health = {proxy: _ProxyHealth() for proxy in dict.fromkeys(normalize_proxy_url(p) for p in proxies)}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        # When False, recording a result never writes to disk; the owner calls save() itself.
+        self.autosave = True
+        self._load_state()
+
+    def __len__(self):
+        return len(self._health)
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, "r") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Could not read proxy health from {self.state_file}, starting fresh: {e}")
+            return
+        for proxy, fields in saved.items():
+            if proxy in self._health:
+                self._health[proxy] = _ProxyHealth(**fields)
+
+    def save(self, force: bool = False):
+        """Writes proxy health to disk if it changed and the save interval has passed (or force is set)."""
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._saved_at < PROXY_STATE_SAVE_INTERVAL_SECONDS):
+                return
+            snapshot = {proxy: {field: getattr(health, field) for field in _ProxyHealth.__slots__}
+                        for proxy, health in self._health.items()}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            atomic_write_text(self.state_file, json.dumps(snapshot, indent=2))
+        except Exception as e:
+            logging.error(f"Could not save proxy health: {e}")
+
+    def _weight(self, health: _ProxyHealth, default_latency: float) -> float:
+        latency = health.latency if health.latency is not None else default_latency
+        return max(health.success_rate, 0.01) ** 2 / max(latency, 0.05)
+
+    def seed(self, checks: list):
+        """
+        Applies bulk validation results (see proxy_validator). Working proxies without a latency
+        measurement start from the tested one; failed proxies start quarantined so no real request
+        is spent discovering they are dead. Existing backoff history is kept.
+        """
+        now = time.time()
+        with self._lock:
+            for check in checks:
+                health = self._health.get(check.proxy)
+                if health is None:
+                    continue
+                if check.ok:
+                    if health.latency is None:
+                        health.latency = check.latency
+                else:
+                    health.quarantined_until = max(health.quarantined_until, now + PROXY_QUARANTINE_BASE_SECONDS)
+            self._dirty = True
+        self.save(force=True)
+
+    def choose(self, exclude=()):
+        """Returns a healthy proxy picked by weight, or None if every proxy is quarantined or excluded."""
+        now = time.time()
+        with self._lock:
+            candidates = [(proxy, health) for proxy, health in self._health.items()
+                          if proxy not in exclude and health.quarantined_until <= now]
+            if not candidates:
+                return None
+            # Unmeasured proxies are treated as average so they still get traffic and a measurement.
+            measured = sorted(health.latency for _, health in candidates if health.latency is not None)
+            default_latency = measured[len(measured) // 2] if measured else 1.0
+            weights = [self._weight(health, default_latency) for _, health in candidates]
+        return random.choices([proxy for proxy, _ in candidates], weights=weights)[0]
+
+    def record_success(self, proxy: str, latency: float):
+        with self._lock:
+            health = self._health.get(proxy)
+            if health is None:
+                return
+            health.latency = latency if health.latency is None else health.latency + PROXY_EWMA_ALPHA * (latency - health.latency)
+            health.success_rate += PROXY_EWMA_ALPHA * (1.0 - health.success_rate)
+            if health.soft_failures or health.strikes:
+                logging.info(f"Proxy {proxy} succeeded. Resetting its failure history.")
+            health.soft_failures = 0
+            health.strikes = 0
+            self._dirty = True
+        if self.autosave:
+            self.save()
+
+    def record_failure(self, proxy: str, hard: bool) -> float:
+        """
+        Records a failed request. Hard failures (connection/proxy errors) quarantine the proxy at
+        once; soft ones (timeouts) after PROXY_SOFT_FAILURE_LIMIT in a row. Returns the quarantine
+        length in seconds, or 0 if the proxy stays in rotation.
+        """
+        with self._lock:
+            health = self._health.get(proxy)
+            if health is None:
+                return 0.0
+            health.success_rate += PROXY_EWMA_ALPHA * (0.0 - health.success_rate)
+            health.soft_failures += 1
+            self._dirty = True
+            quarantine = 0.0
+            if hard or health.soft_failures >= PROXY_SOFT_FAILURE_LIMIT:
+                quarantine = min(PROXY_QUARANTINE_BASE_SECONDS * 2 ** health.strikes, PROXY_QUARANTINE_MAX_SECONDS)
+                health.strikes += 1
+                health.soft_failures = 0
+                health.quarantined_until = time.time() + quarantine
+        if self.autosave:
+            self.save()
+        return quarantine
+
+    def proxies(self) -> list[str]:
+        return list(self._health)
+
+    def available_count(self) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for health in self._health.values() if health.quarantined_until <= now)
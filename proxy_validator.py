@@ -0,0 +1,137 @@
+# proxy_validator.py
+"""
+Bulk proxy validation: tests many proxies concurrently against one target URL with tight
+timeouts and returns the working ones ranked by latency. Results are cached for
+PROXY_VALIDATION_TTL_SECONDS, so re-validating a large list only tests the proxies that
+are new or expired.
+
+Can also be run on its own:  python proxy_validator.py [proxies.txt] [--write]
+"""
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import concurrent.futures
+from typing import NamedTuple, Optional
+
+import requests
+
+from config import (
+    PROXIES_FILE, USER_AGENT_LIST, PROXY_VALIDATION_URL, PROXY_VALIDATION_TIMEOUT_SECONDS,
+    PROXY_VALIDATION_WORKERS, PROXY_VALIDATION_TTL_SECONDS, PROXY_VALIDATION_CACHE_FILE
+)
+from utils import atomic_write_text, load_proxies_from_file, save_proxies_to_file, normalize_proxy_url
+
+
+class ProxyCheck(NamedTuple):
+    proxy: str
+    ok: bool
+    latency: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: float = 0.0
+
+
+def check_proxy(proxy: str, target: str = PROXY_VALIDATION_URL, timeout: float = PROXY_VALIDATION_TIMEOUT_SECONDS) -> ProxyCheck:
+    """Sends one request through a proxy. Any HTTP answer below 500 means the proxy works."""
+    checked_at = time.time()
+    try:
+        with requests.get(target, proxies={"http": proxy, "https": proxy}, timeout=timeout, stream=True,
+                          headers={"User-Agent": random.choice(USER_AGENT_LIST)}) as r:
+            if r.status_code >= 500:
+                return ProxyCheck(proxy, False, error=f"HTTP {r.status_code}", checked_at=checked_at)
+            return ProxyCheck(proxy, True, latency=r.elapsed.total_seconds(), checked_at=checked_at)
+    except requests.exceptions.RequestException as e:
+        return ProxyCheck(proxy, False, error=type(e).__name__, checked_at=checked_at)
+
+
+def _load_cache(target: str) -> dict:
+    try:
+        with open(PROXY_VALIDATION_CACHE_FILE, "r") as f:
+            cached = json.load(f).get(target, {})
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable proxy validation cache: {e}")
+        return {}
+    return {proxy: ProxyCheck(proxy, **fields) for proxy, fields in cached.items()}
+
+
+def _save_cache(target: str, checks: dict):
+    try:
+        with open(PROXY_VALIDATION_CACHE_FILE, "r") as f:
+            cache = json.load(f)
+    except Exception:
+        cache = {}
+    cache[target] = {proxy: check._asdict() for proxy, check in checks.items()}
+    for fields in cache[target].values():
+        del fields["proxy"]
+    try:
+        atomic_write_text(PROXY_VALIDATION_CACHE_FILE, json.dumps(cache))
+    except Exception as e:
+        logging.error(f"Could not save proxy validation cache: {e}")
+
+
+def validate_proxies(proxies: list[str], target: str = PROXY_VALIDATION_URL, timeout: float = PROXY_VALIDATION_TIMEOUT_SECONDS,
+                     workers: int = PROXY_VALIDATION_WORKERS, stop_event: threading.Event = None, progress=None) -> list[ProxyCheck]:
+    """
+    Validates proxies concurrently, reusing cached results younger than the TTL. Returns one
+    check per proxy: working proxies first, fastest first, then the failed ones. `progress`
+    is called as progress(done, total) while the tests run.
+    """
+    proxies = list(dict.fromkeys(normalize_proxy_url(p) for p in proxies if p.strip()))
+    cached = _load_cache(target)
+    now = time.time()
+    results = {proxy: cached[proxy] for proxy in proxies
+               if proxy in cached and now - cached[proxy].checked_at < PROXY_VALIDATION_TTL_SECONDS}
+    to_check = [proxy for proxy in proxies if proxy not in results]
+    if to_check:
+        logging.info(f"Validating {len(to_check)} proxies against {target} ({len(results)} cached).")
+
+    done = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(to_check) or 1)), thread_name_prefix="proxy-check") as pool:
+        futures = [pool.submit(check_proxy, proxy, target, timeout) for proxy in to_check]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                check = future.result()
+                results[check.proxy] = check
+                done += 1
+                if progress:
+                    progress(done, len(to_check))
+                if stop_event is not None and stop_event.is_set():
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+
+    cached.update(results)
+    _save_cache(target, cached)
+    working = sorted((check for check in results.values() if check.ok), key=lambda check: check.latency)
+    failed = [check for check in results.values() if not check.ok]
+    if to_check:
+        logging.info(f"Proxy validation finished: {len(working)} of {len(results)} proxies work.")
+    return working + failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test proxies concurrently and rank the working ones by latency.")
+    parser.add_argument("file", nargs="?", default=PROXIES_FILE, help=f"proxy list, one per line (default: {PROXIES_FILE})")
+    parser.add_argument("--target", default=PROXY_VALIDATION_URL, help="URL requested through each proxy")
+    parser.add_argument("--timeout", type=float, default=PROXY_VALIDATION_TIMEOUT_SECONDS, help="seconds before a proxy counts as dead")
+    parser.add_argument("--workers", type=int, default=PROXY_VALIDATION_WORKERS, help="proxies tested at once")
+    parser.add_argument("--write", action="store_true", help="rewrite the file with only the working proxies, fastest first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    checks = validate_proxies(load_proxies_from_file(args.file), args.target, args.timeout, args.workers)
+    for check in checks:
+        print(f"{check.proxy}\t{f'{check.latency * 1000:.0f} ms' if check.ok else 'FAILED: ' + check.error}")
+    if args.write:
+        save_proxies_to_file([check.proxy for check in checks if check.ok], args.file)
+    return 0 if any(check.ok for check in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
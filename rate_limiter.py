@@ -0,0 +1,158 @@
+# rate_limiter.py
+import re
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from config import DISCORD_API_BASE, RETRY_AFTER_DEFAULT, RATE_LIMIT_SAFETY_MARGIN
+
+# Snowflake IDs in a path are minor parameters, except the channel/guild/webhook ID that
+# Discord uses as the "major parameter" of a route.
+_MAJOR_PARAMETER_RE = re.compile(r"^/(channels|guilds|webhooks)/(\d+)")
+_SNOWFLAKE_RE = re.compile(r"/\d{15,}")
+
+
+class _Bucket:
+    __slots__ = ("limit", "remaining", "reset_at")
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0
+
+
+class RateLimitGovernor:
+    """
+    Schedules Discord API requests against the rate-limit buckets the API reports.
+
+    Each response's X-RateLimit-* headers update the bucket of its route, and acquire()
+    only blocks when that bucket (or the global limit) is exhausted, for exactly as long
+    as the reset time or Retry-After says. Shared by every thread that talks to the API.
+    """
+
+    def __init__(self, stop_event: threading.Event):
+        self.stop_event = stop_event
+        self._lock = threading.Lock()
+        self._route_to_bucket = {}   # route key -> bucket hash reported by Discord
+        self._buckets = {}           # bucket hash + major parameter -> _Bucket
+        self._global_reset_at = 0.0
+
+    @staticmethod
+    def is_api_url(url: str) -> bool:
+        return url.startswith(DISCORD_API_BASE)
+
+    @staticmethod
+    def route_key(method: str, url: str) -> str:
+        """Reduces a URL to its rate-limit route, e.g. 'GET /channels/123/messages'."""
+        path = urlsplit(url).path
+        api_path = urlsplit(DISCORD_API_BASE).path
+        if path.startswith(api_path):
+            path = path[len(api_path):]
+        major = _MAJOR_PARAMETER_RE.match(path)
+        if major:
+            path = major.group(0) + _SNOWFLAKE_RE.sub("/{id}", path[major.end():])
+        else:
+            path = _SNOWFLAKE_RE.sub("/{id}", path)
+        return f"{method.upper()} {path}"
+
+    def _bucket_for(self, route: str) -> _Bucket:
+        bucket_hash = self._route_to_bucket.get(route)
+        key = f"{bucket_hash}:{self._major_of(route)}" if bucket_hash else route
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        return bucket
+
+    @staticmethod
+    def _major_of(route: str) -> str:
+        major = _MAJOR_PARAMETER_RE.match(route.split(" ", 1)[-1])
+        return major.group(0) if major else ""
+
+    def try_acquire(self, route: str) -> float:
+        """
+        Takes a request slot on this route if one is free and returns 0, otherwise returns the
+        seconds to wait before trying again. Never blocks, so asyncio code can await the wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket_for(route)
+            if bucket.reset_at and now >= bucket.reset_at:
+                # The window has rolled over; the next response will report the real count.
+                bucket.remaining = bucket.limit
+                bucket.reset_at = 0.0
+
+            wait = max(0.0, self._global_reset_at - now)
+            if not wait and bucket.remaining is not None and bucket.remaining <= 0:
+                wait = max(0.0, bucket.reset_at - now) if bucket.reset_at else RETRY_AFTER_DEFAULT
+
+            if not wait and bucket.remaining is not None:
+                bucket.remaining -= 1
+            return wait
+
+    def acquire(self, route: str) -> bool:
+        """Blocks until a request on this route is allowed. Returns False if the scraper is stopping."""
+        while not self.stop_event.is_set():
+            wait = self.try_acquire(route)
+            if not wait:
+                return True
+            logging.debug(f"Rate limit reached for {route}. Waiting {wait:.2f}s.")
+            self.stop_event.wait(wait + RATE_LIMIT_SAFETY_MARGIN)
+        return False
+
+    def update(self, route: str, headers) -> None:
+        """Records the bucket state reported in a response's X-RateLimit-* headers."""
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is None or reset_after is None:
+            return
+
+        with self._lock:
+            if bucket_hash:
+                self._route_to_bucket[route] = bucket_hash
+            bucket = self._bucket_for(route)
+            try:
+                limit = headers.get("X-RateLimit-Limit")
+                if limit is not None:
+                    bucket.limit = int(limit)
+                reported_remaining = int(remaining)
+                reset_at = time.monotonic() + float(reset_after)
+            except ValueError:
+                return
+            # Responses to concurrent requests can arrive out of order; keep the most pessimistic count.
+            if bucket.remaining is None or reset_at > bucket.reset_at + 0.5:
+                bucket.remaining = reported_remaining
+            else:
+                bucket.remaining = min(bucket.remaining, reported_remaining)
+            bucket.reset_at = reset_at
+
+    def handle_429(self, route: str, response) -> float:
+        """Applies a 429 response and returns the number of seconds to back off."""
+        retry_after = None
+        is_global = response.headers.get("X-RateLimit-Global", "").lower() == "true"
+        try:
+            body = response.json()
+            retry_after = float(body.get("retry_after"))
+            is_global = is_global or bool(body.get("global"))
+        except (ValueError, TypeError, AttributeError):
+            pass
+        if retry_after is None:
+            try:
+                retry_after = float(response.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                retry_after = RETRY_AFTER_DEFAULT
+
+        if not is_global:
+            self.update(route, response.headers)
+        with self._lock:
+            reset_at = time.monotonic() + retry_after
+            if is_global:
+                self._global_reset_at = max(self._global_reset_at, reset_at)
+            else:
+                bucket = self._bucket_for(route)
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, reset_at)
+
+        logging.warning(f"Rate limited on {route} ({'global' if is_global else 'route'}). Retrying after {retry_after:.2f}s.")
+        return retry_after
@@ -0,0 +1,61 @@
+# routing.py
+import os
+import logging
+import threading
+
+from config import (
+    PROXY_STATE_FILE, DOWNLOAD_PROXIES_FILE, DOWNLOAD_PROXY_STATE_FILE,
+    API_ROUTE, API_CONNECT_TIMEOUT_SECONDS, API_READ_TIMEOUT_SECONDS, API_MAX_CONCURRENT,
+    DOWNLOAD_ROUTE, DOWNLOAD_CONNECT_TIMEOUT_SECONDS, DOWNLOAD_READ_TIMEOUT_SECONDS, DOWNLOAD_MAX_CONCURRENT
+)
+from proxy_pool import ProxyPool
+from utils import load_proxies_from_file
+
+# Traffic classes: small JSON calls to the Discord API, and attachment transfers from the CDN.
+API_TRAFFIC = "api"
+DOWNLOAD_TRAFFIC = "download"
+
+
+class TrafficRoute:
+    """
+    How one class of traffic is sent: directly or through its own proxy pool, with its own
+    (connect, read) timeouts and a cap on how many of its requests run at once.
+    """
+
+    def __init__(self, name: str, pool: ProxyPool, connect_timeout: float, read_timeout: float, max_concurrent: int):
+        self.name = name
+        self.pool = pool
+        self.timeout = (connect_timeout, read_timeout)
+        self.slots = threading.BoundedSemaphore(max(1, max_concurrent))
+
+    @property
+    def direct(self) -> bool:
+        return self.pool is None or not len(self.pool)
+
+    def describe(self) -> str:
+        return "direct" if self.direct else f"{len(self.pool)} proxies"
+
+
+def build_routes(use_proxies: bool, proxy_list: list[str]) -> dict:
+    """
+    Builds the route for each traffic class from the *_ROUTE settings. Downloads sent through
+    proxies use DOWNLOAD_PROXIES_FILE when it lists any, else the main list, and in either
+    case keep health scores separate from the API pool.
+    """
+    api_pool = None
+    if use_proxies and API_ROUTE == "proxies":
+        api_pool = ProxyPool(proxy_list, PROXY_STATE_FILE)
+
+    download_pool = None
+    if use_proxies and DOWNLOAD_ROUTE == "proxies":
+        download_proxies = load_proxies_from_file(DOWNLOAD_PROXIES_FILE) if os.path.exists(DOWNLOAD_PROXIES_FILE) else []
+        download_pool = ProxyPool(download_proxies or proxy_list, DOWNLOAD_PROXY_STATE_FILE)
+
+    routes = {
+        API_TRAFFIC: TrafficRoute(API_TRAFFIC, api_pool, API_CONNECT_TIMEOUT_SECONDS, API_READ_TIMEOUT_SECONDS, API_MAX_CONCURRENT),
+        DOWNLOAD_TRAFFIC: TrafficRoute(DOWNLOAD_TRAFFIC, download_pool, DOWNLOAD_CONNECT_TIMEOUT_SECONDS,
+                                       DOWNLOAD_READ_TIMEOUT_SECONDS, DOWNLOAD_MAX_CONCURRENT),
+    }
+    for route in routes.values():
+        logging.info(f"Routing {route.name} traffic {route.describe()}, timeouts {route.timeout}.")
+    return routes
@@ -7,17 +7,83 @@ import requests
 import logging
 import queue
 import shutil 
-from moviepy import VideoFileClip
+import concurrent.futures
 
 from config import *
 from utils import (
-    load_downloaded_attachments, save_downloaded_attachments,
+    load_downloaded_attachments, append_downloaded_attachment,
     generate_clean_filename, build_metadata_to_save,
-    rebuild_html_index,
-    save_metadata_to_db,
-    save_proxies_to_file 
+    rebuild_html_index, DebouncedIndexRebuilder,
+    save_metadata_to_db, update_video_location,
+    snowflake_to_timestamp, format_duration,
+    atomic_write_text, ContentHasher,
+    find_video_by_content_hash, find_dedup_candidates,
+    save_video_fingerprint, load_video_fingerprints, find_unfingerprinted_videos, mark_near_duplicate,
+    save_download_retry, load_due_download_retries, postpone_download_retry, delete_download_retry, count_download_retries
 )
-from config import USER_AGENT_LIST
+from rate_limiter import RateLimitGovernor
+from routing import build_routes, API_TRAFFIC, DOWNLOAD_TRAFFIC
+from transport import create_transport
+from proxy_validator import validate_proxies
+from metadata_store import get_metadata_store
+from media_probe import probe_file, StreamingSniffer
+from fingerprint import fingerprint_file, find_ffmpeg, NearDuplicateIndex
+from cdn_urls import AttachmentUrlRefresher, is_url_stale
+from channel_scheduler import ChannelScheduler
+from lanes import LaneQueue, LIVE_LANE, RETRY_LANE, BACKFILL_LANE
+from bandwidth import BandwidthLimiter
+
+CATEGORY_FOLDERS = ["With_Audio", "Without_Audio", "Invalid_or_Corrupt"]
+
+class DownloadError(Exception):
+    """A download attempt failed in a way that a later attempt may recover from."""
+
+class PartFileWriter:
+    """
+    Writes a download's chunks to its .part file while hashing them. A fresh download is held
+    back until the sniffer has seen its track headers, so the .part can be created straight in
+    its category folder; a resumed part is appended to where it already is.
+    """
+
+    def __init__(self, new_part_path, unique_id: str, part_path: str = None):
+        self.new_part_path = new_part_path
+        self.unique_id = unique_id
+        self.part_path = part_path
+        self.hasher = ContentHasher()
+        self.sniffer = None if part_path else StreamingSniffer(SNIFF_MAX_BYTES)
+        self.f = None
+        if part_path:
+            self.hasher.update_from_file(part_path)
+            self.f = open(part_path, "ab")
+
+    def _open(self, sniff_result):
+        self.part_path = self.new_part_path(self.unique_id, sniff_result)
+        self.f = open(self.part_path, "wb")
+
+    def write(self, chunk: bytes):
+        if self.f is None:
+            if not self.sniffer.feed(chunk):
+                return
+            self._open(self.sniffer.result)
+            chunk = self.sniffer.take_buffer()
+        self.f.write(chunk)
+        self.hasher.update(chunk)
+
+    def finish(self):
+        """Closes the .part and returns (part_path, sniff_result, hasher)."""
+        if self.f is None:
+            # The whole file fit in the sniff buffer, so it can be judged completely.
+            self._open(self.sniffer.finish())
+            chunk = self.sniffer.take_buffer()
+            self.f.write(chunk)
+            self.hasher.update(chunk)
+        self.close()
+        return self.part_path, (self.sniffer.result if self.sniffer else None), self.hasher
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
 
 class ScraperLogic:
     def __init__(self, token: str, full_scan_channels: list[str], new_only_channels: list[str], download_dir: str, use_proxies: bool, proxy_list: list[str], gui_queue: queue.Queue):
@@ -34,258 +100,925 @@ class ScraperLogic:
         self.paused = False
         self.stop_event = threading.Event()
         
-        self.running_proxies = list(self.initial_proxy_list)
-        self.proxy_index = 0
-        
-        self.proxy_failure_counts = {proxy: 0 for proxy in self.running_proxies}
+        # API paging and attachment downloads each get their own route (proxy pool or direct).
+        self.routes = build_routes(self.use_proxies, self.initial_proxy_list)
         
-        self.session = requests.Session()
-        self.session.headers.update({"Authorization": self.token, "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"})
+        self.rate_limiter = RateLimitGovernor(self.stop_event)
+
+        # Keeps a warm connection pool per proxy; HTTP/2 when httpx is installed.
+        self.transport = create_transport({"Authorization": self.token})
+        # Re-signs expired CDN URLs of queued and retried downloads, many per API call.
+        self.url_refresher = AttachmentUrlRefresher(self._post_refresh_urls)
+        # Total and per-proxy download bandwidth caps; adjustable from the GUI at runtime.
+        self.bandwidth = BandwidthLimiter()
         
         self.downloaded_attachments = load_downloaded_attachments()
         self.download_count = len(self.downloaded_attachments)
+
+        # Attachments found by the channel scanner wait here for a download worker, in priority lanes.
+        # Each lane is bounded so paging blocks (backpressure) instead of racing ahead.
+        self.download_queue = LaneQueue(DOWNLOAD_QUEUE_SIZE)
+        # Every scanner but one may backfill, so live catch-up always has a scanner to itself.
+        # How fast backfill actually pages is set by its download lane filling up.
+        self.backfill_slots = threading.BoundedSemaphore(max(1, CHANNEL_SCANNERS - 1))
+        self.queued_attachments = set()
+        self.download_lock = threading.Lock()
+        self.download_workers = []
+        # Failed downloads go to the retry queue in the database (see _schedule_retry); this holds the
+        # attempt counts of retries currently being downloaded.
+        self.retry_attempts = {}
+        self.retry_thread = None
+        # SHA-256 -> filename of videos kept this session; the DB write for a new file may still be queued.
+        self.content_hashes = {}
+        # A burst of finished downloads triggers a single gallery rebuild.
+        self.index_rebuilder = DebouncedIndexRebuilder(self.download_dir)
+        # Container header probes run in separate processes, off the download threads.
+        self.probe_pool = None
+        # Keyframe fingerprinting for near-duplicates; stays None when ffmpeg is unavailable.
+        self.fingerprint_pool = None
+        self.near_duplicate_index = NearDuplicateIndex(FINGERPRINT_MAX_DISTANCE, FINGERPRINT_MIN_MATCHING_FRAMES)
+
+        # Seconds each channel's 'after' cursor trails the newest message, as of its last scan.
+        self.channel_lag = {}
+
         self.scraper_state = self._load_state()
+        # Polls each channel on its own schedule, from the activity recorded with its cursors.
+        self.channel_scheduler = ChannelScheduler(list(self.channels_to_scan),
+                                                  {cid: self.scraper_state.get(f"{cid}_activity") for cid in self.channels_to_scan})
+        # Channel scanners run in parallel; each owns its channel's cursors, the lock guards the shared file.
+        self.state_lock = threading.RLock()
+        # Checkpoints are coalesced: see _save_state.
+        self.state_dirty_updates = 0
+        self.state_saved_at = time.monotonic()
+        self.active_channels = set()
+        self.scanner_pool = None
         # This line is no longer necessary as the metadata folder is deprecated, but leaving it does no harm.
         os.makedirs(os.path.join(self.download_dir, "metadata"), exist_ok=True)
         self._update_gui_status("Idle")
 
     def _load_state(self) -> dict:
-        if os.path.exists(STATE_FILE):
+        # The previous checkpoint is kept as a backup, so a damaged file costs one checkpoint, not every cursor.
+        for path in (STATE_FILE, STATE_FILE + ".bak"):
+            if not os.path.exists(path): continue
             try:
-                with open(STATE_FILE, 'r') as f: return json.load(f)
-            except json.JSONDecodeError: return {}
+                with open(path, 'r') as f: state = json.load(f)
+                if path != STATE_FILE:
+                    logging.warning(f"Restored scraper state from backup '{path}'.")
+                return state
+            except (IOError, json.JSONDecodeError) as e:
+                logging.error(f"Scraper state file '{path}' is unreadable: {e}")
+        if os.path.exists(STATE_FILE):
+            logging.error("No readable scraper state found. All channels will be scanned from the start.")
         return {}
 
-    def _save_state(self):
-        try:
-            with open(STATE_FILE, 'w') as f: json.dump(self.scraper_state, f, indent=2)
-        except Exception as e: logging.error(f"Could not save scraper state: {e}")
+    def _save_state(self, force: bool = False):
+        """
+        Writes a checkpoint (write-then-rename) if there are unsaved updates and either `force` is set,
+        STATE_SAVE_EVERY_UPDATES updates have piled up or STATE_SAVE_INTERVAL_SECONDS have passed.
+        """
+        with self.state_lock:
+            if not self.state_dirty_updates: return
+            due = (force or self.state_dirty_updates >= STATE_SAVE_EVERY_UPDATES
+                   or time.monotonic() - self.state_saved_at >= STATE_SAVE_INTERVAL_SECONDS)
+            if not due: return
+            try:
+                atomic_write_text(STATE_FILE, json.dumps(self.scraper_state, indent=2), backup_path=STATE_FILE + ".bak")
+                self.state_dirty_updates = 0
+                self.state_saved_at = time.monotonic()
+            except Exception as e: logging.error(f"Could not save scraper state: {e}")
+
+    def _update_state(self, updates: dict, force: bool = False):
+        """Applies cursor updates from one scanner and checkpoints them. Keys are per-channel, so scanners never overlap."""
+        with self.state_lock:
+            self.scraper_state.update(updates)
+            self.state_dirty_updates += 1
+            self._save_state(force=force)
 
     def _update_gui_status(self, status_text: str):
         self.gui_queue.put({"status": status_text, "count": self.download_count})
 
-    def _execute_request_with_failover(self, url: str, **kwargs):
-        if not self.use_proxies or not self.running_proxies:
+    def _send_request(self, url: str, proxy: str = None, method: str = "GET", **kwargs):
+        """Sends one request. Discord API calls are paced by the rate-limit governor and 429s are retried."""
+        is_api = self.rate_limiter.is_api_url(url)
+        route = self.rate_limiter.route_key(method, url) if is_api else None
+        for _ in range(RATE_LIMIT_MAX_RETRIES + 1):
+            if is_api and not self.rate_limiter.acquire(route):
+                return None
+            response = self.transport.request(method, url, proxy=proxy, **kwargs)
+            # Streams are throttled per proxy, so remember which one this response comes through.
+            response.via_proxy = proxy
+            if not is_api:
+                break
+            self.rate_limiter.update(route, response.headers)
+            if response.status_code != 429:
+                break
+            # A 429 is not the proxy's fault; wait out Retry-After (enforced by acquire) and try again.
+            retry_after = self.rate_limiter.handle_429(route, response)
+            response.close()
+            self._update_gui_status(f"Rate limited by Discord. Backing off {retry_after:.1f}s...")
+        if response.status_code >= 400:
+            # Nobody reads an error body, so release the (possibly streamed) connection before raising.
+            response.close()
+        response.raise_for_status()
+        return response
+
+    def _execute_request_with_failover(self, url: str, traffic: str = API_TRAFFIC, **kwargs):
+        """
+        Sends a request along its traffic class's route, with that route's timeouts. Streamed
+        responses are read after this returns, so their callers hold the route's slot instead.
+        """
+        route = self.routes[traffic]
+        kwargs.setdefault("timeout", route.timeout)
+        if kwargs.get("stream"):
+            return self._send_on_route(route, url, **kwargs)
+        with route.slots:
+            return self._send_on_route(route, url, **kwargs)
+
+    def _send_on_route(self, route, url: str, **kwargs):
+        proxy_pool = route.pool
+        if route.direct:
             try:
-                headers = {'User-Agent': random.choice(USER_AGENT_LIST)}
-                response = self.session.get(url, headers=headers, **kwargs)
-                response.raise_for_status()
-                return response
+                return self._send_request(url, **kwargs)
             except requests.exceptions.RequestException as e:
                 logging.error(f"Direct request to {url} failed: {e}")
                 return None
 
-        attempts = 0
-        max_attempts = len(self.running_proxies)
-        while attempts < max_attempts and self.running_proxies:
+        # Each proxy is tried at most once per request; the pool picks them by health score.
+        tried = set()
+        while len(tried) < len(proxy_pool):
             if self.stop_event.is_set(): return None
 
-            self.proxy_index %= len(self.running_proxies)
-            current_proxy_url = self.running_proxies[self.proxy_index]
-            proxies = {"http": current_proxy_url, "https": current_proxy_url}
+            current_proxy_url = proxy_pool.choose(exclude=tried)
+            if current_proxy_url is None: break
+            tried.add(current_proxy_url)
             
             try:
-                logging.info(f"Attempting request via proxy {current_proxy_url} ({self.proxy_index + 1}/{len(self.running_proxies)})")
-                headers = {'User-Agent': random.choice(USER_AGENT_LIST)}
-                response = self.session.get(url, headers=headers, proxies=proxies, **kwargs)
-                response.raise_for_status()
-                
-                if self.proxy_failure_counts.get(current_proxy_url, 0) > 0:
-                    logging.info(f"Proxy {current_proxy_url} succeeded. Resetting failure count.")
-                    self.proxy_failure_counts[current_proxy_url] = 0
-                
-                self.proxy_index = (self.proxy_index + 1) % len(self.running_proxies)
+                logging.info(f"Attempting request via proxy {current_proxy_url} (try {len(tried)}, {proxy_pool.available_count()} {route.name} proxies available)")
+                response = self._send_request(url, proxy=current_proxy_url, **kwargs)
+                if response is None: return None
+                # elapsed is the time to the response headers, so streamed downloads are measured fairly.
+                proxy_pool.record_success(current_proxy_url, response.elapsed.total_seconds())
                 return response
 
+            except requests.exceptions.HTTPError as e:
+                # The proxy delivered a real answer from Discord; trying another proxy will not change it.
+                logging.error(f"Request to {url} failed via proxy {current_proxy_url}: {e}")
+                proxy_pool.record_success(current_proxy_url, e.response.elapsed.total_seconds())
+                return None
+
             except (requests.exceptions.ProxyError, requests.exceptions.ConnectionError) as e:
-                logging.error(f"Proxy {current_proxy_url} is dead (Connection/Proxy Error). Removing immediately. Reason: {e}")
-                self._update_gui_status(f"Dead proxy removed: {current_proxy_url}")
-                
-                self.running_proxies.pop(self.proxy_index)
-                if current_proxy_url in self.proxy_failure_counts:
-                    del self.proxy_failure_counts[current_proxy_url]
-
-                save_proxies_to_file(self.running_proxies)
-                
-                max_attempts = len(self.running_proxies)
-                attempts = 0
-                continue 
+                quarantine = proxy_pool.record_failure(current_proxy_url, hard=True)
+                logging.error(f"Proxy {current_proxy_url} failed (Connection/Proxy Error). Quarantined for {format_duration(quarantine)}. Reason: {e}")
+                self._update_gui_status(f"Proxy quarantined: {current_proxy_url}")
 
             except requests.exceptions.Timeout as e:
-                logging.warning(f"Proxy {current_proxy_url} timed out. Applying 5-try rule. Reason: {e}")
-                
-                self.proxy_failure_counts[current_proxy_url] = self.proxy_failure_counts.get(current_proxy_url, 0) + 1
-                failure_count = self.proxy_failure_counts[current_proxy_url]
-                logging.warning(f"Proxy {current_proxy_url} has {failure_count}/5 consecutive soft failures.")
-
-                if failure_count >= 5:
-                    logging.error(f"Proxy {current_proxy_url} has failed 5 times. Removing it from the list.")
-                    self._update_gui_status(f"Removing slow proxy: {current_proxy_url}")
-                    
-                    self.running_proxies.pop(self.proxy_index)
-                    del self.proxy_failure_counts[current_proxy_url]
-
-                    save_proxies_to_file(self.running_proxies)
-                    
-                    max_attempts = len(self.running_proxies)
-                    attempts = 0
+                quarantine = proxy_pool.record_failure(current_proxy_url, hard=False)
+                if quarantine:
+                    logging.error(f"Proxy {current_proxy_url} timed out {PROXY_SOFT_FAILURE_LIMIT} times in a row. Quarantined for {format_duration(quarantine)}.")
+                    self._update_gui_status(f"Slow proxy quarantined: {current_proxy_url}")
                 else:
-                    # This check prevents an error if the last proxy is removed
-                    if self.running_proxies:
-                        self.proxy_index = (self.proxy_index + 1) % len(self.running_proxies)
-            
-            attempts += 1
+                    logging.warning(f"Proxy {current_proxy_url} timed out. Reason: {e}")
 
-        logging.error(f"All proxies failed for the request to {url}.")
+        logging.error(f"All {route.name} proxies failed for the request to {url}.")
         self._update_gui_status("All proxies failed. Check console/logs.")
         return None
 
-    def run(self):
+    def _validate_proxies(self):
+        """Tests every route's proxies up front and seeds the pools with the results."""
+        pools = [route.pool for route in self.routes.values() if not route.direct]
+        proxies = list(dict.fromkeys(proxy for pool in pools for proxy in pool.proxies()))
+        total = len(proxies)
+        self._update_gui_status(f"Validating {total} proxies...")
+        def progress(done, to_check):
+            if done % 50 == 0 or done == to_check:
+                self._update_gui_status(f"Validating proxies: {done}/{to_check} tested...")
+        checks = validate_proxies(proxies, stop_event=self.stop_event, progress=progress)
+        for pool in pools:
+            pool.seed(checks)
+        working = sum(1 for check in checks if check.ok)
+        logging.info(f"{working} of {total} proxies passed validation.")
+        self._update_gui_status(f"{working} of {total} proxies passed validation.")
+
+    def _start_download_workers(self):
+        for i in range(max(1, DOWNLOAD_WORKERS)):
+            worker = threading.Thread(target=self._download_worker, name=f"download-worker-{i + 1}", daemon=True)
+            worker.start()
+            self.download_workers.append(worker)
+        logging.info(f"Started {len(self.download_workers)} download workers.")
+
+    def _stop_download_workers(self):
+        for worker in self.download_workers:
+            worker.join()
+        self.download_workers = []
+        dropped = 0
+        while True:
+            try:
+                attachment, message_data, channel_id = self.download_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._schedule_retry(attachment, message_data, channel_id, "stopped before the download started", count_attempt=False)
+            dropped += 1
+        if dropped:
+            logging.info(f"{dropped} queued downloads were not started before stopping; they were moved to the retry queue.")
+
+    def _download_worker(self):
+        while not self.stop_event.is_set():
+            if self.paused:
+                self.stop_event.wait(2)
+                continue
+            try:
+                attachment, message_data, channel_id = self.download_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            unique_id = f"{message_data['id']}-{attachment['id']}"
+            try:
+                self._download_file(attachment, message_data, channel_id)
+            finally:
+                self._release_attachment(unique_id)
+
+    def _enqueue_download(self, attachment: dict, message_data: dict, channel_id: str, lane: str = LIVE_LANE) -> bool:
+        """Hands an attachment to the worker pool in a priority lane, blocking while that lane is full."""
+        unique_id = f"{message_data['id']}-{attachment['id']}"
+        if not self._claim_attachment(unique_id):
+            return False
+
+        while not self.stop_event.is_set():
+            try:
+                self.download_queue.put(lane, (attachment, message_data, channel_id), timeout=1)
+                return True
+            except queue.Full:
+                continue
+
+        self._release_attachment(unique_id)
+        return False
+
+    def _claim_attachment(self, unique_id: str) -> bool:
+        """Marks an attachment as queued. Returns False if it is already downloaded or queued."""
+        with self.download_lock:
+            if unique_id in self.downloaded_attachments or unique_id in self.queued_attachments:
+                return False
+            self.queued_attachments.add(unique_id)
+            return True
+
+    def _release_attachment(self, unique_id: str):
+        with self.download_lock:
+            self.queued_attachments.discard(unique_id)
+
+    def _schedule_retry(self, attachment: dict, message_data: dict, channel_id: str, error, count_attempt: bool = True):
+        """
+        Puts a download that failed, or was cut short by a stop, in the retry queue; the channel
+        cursor has already moved past its message. Each failed round doubles the backoff.
+        """
+        unique_id = f"{message_data['id']}-{attachment['id']}"
+        with self.download_lock:
+            attempts = self.retry_attempts.pop(unique_id, 0)
+        if count_attempt:
+            attempts += 1
+
+        next_attempt_at = time.time()
+        if attempts >= RETRY_MAX_ATTEMPTS:
+            next_attempt_at = None
+            logging.error(f"Giving up on {attachment.get('filename')} after {attempts} failed rounds. Last error: {error}")
+        elif count_attempt:
+            delay = min(RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_DELAY_SECONDS) * random.uniform(0.9, 1.1)
+            next_attempt_at += delay
+            logging.info(f"Will retry {attachment.get('filename')} in {delay / 60:.0f} minutes (round {attempts + 1}/{RETRY_MAX_ATTEMPTS}).")
+        save_download_retry(unique_id, channel_id, attachment, message_data, attempts, next_attempt_at, str(error))
+
+    def _clear_retry(self, unique_id: str):
+        """Removes an attachment from the retry queue once it has been stored."""
+        with self.download_lock:
+            retried = self.retry_attempts.pop(unique_id, None) is not None
+        if retried:
+            delete_download_retry(unique_id)
+
+    def _due_retries(self) -> list:
+        """
+        Loads retries whose backoff has expired as (attachment, message_data, channel_id). Each one
+        handed out is postponed by a base delay, so it is not loaded again while it waits in the queue;
+        a failed round reschedules it and a successful one deletes it.
+        """
+        due = []
+        for row in load_due_download_retries(DOWNLOAD_QUEUE_SIZE):
+            with self.download_lock:
+                stored = row["unique_id"] in self.downloaded_attachments
+                queued = row["unique_id"] in self.queued_attachments
+                if queued:
+                    # Keep the failed rounds so far if this run fails too, without resetting a count in flight.
+                    self.retry_attempts.setdefault(row["unique_id"], row["attempts"])
+            if stored:
+                delete_download_retry(row["unique_id"])
+                continue
+            if queued:
+                # Already on its way (e.g. the channel scanner found it again), so its URL is left alone.
+                postpone_download_retry(row["unique_id"], time.time() + RETRY_BASE_DELAY_SECONDS)
+                continue
+            try:
+                item = (json.loads(row["attachment_json"]), json.loads(row["message_json"]), row["channel_id"])
+            except (TypeError, ValueError) as e:
+                logging.error(f"Dropping unreadable retry entry {row['unique_id']}: {e}")
+                delete_download_retry(row["unique_id"])
+                continue
+            with self.download_lock:
+                self.retry_attempts[row["unique_id"]] = row["attempts"]
+            postpone_download_retry(row["unique_id"], time.time() + RETRY_BASE_DELAY_SECONDS)
+            due.append(item)
+
+        # Retries have usually waited long enough for their URLs to expire; re-sign them together.
+        stale = [attachment["url"] for attachment, _, _ in due if is_url_stale(attachment["url"])]
+        if stale:
+            refreshed = self.url_refresher.refresh_many(stale)
+            for attachment, _, _ in due:
+                attachment["url"] = refreshed.get(attachment["url"], attachment["url"])
+        return due
+
+    def _retry_loop(self):
+        """Feeds due retries into the download queue alongside the channel scanners."""
+        while not self.stop_event.is_set():
+            if not self.paused:
+                try:
+                    requeued = sum(self._enqueue_download(*item, lane=RETRY_LANE) for item in self._due_retries())
+                    if requeued:
+                        logging.info(f"Requeued {requeued} downloads from the retry queue.")
+                except Exception as e:
+                    logging.error(f"Retry scheduler failed: {e}")
+            self.stop_event.wait(RETRY_POLL_INTERVAL_SECONDS)
+
+    def _post_refresh_urls(self, urls: list):
+        response = self._execute_request_with_failover(f"{DISCORD_API_BASE}/attachments/refresh-urls", method="POST",
+                                                       json={"attachment_urls": urls})
+        return response.json().get("refreshed_urls", []) if response else None
+
+    def _ensure_fresh_url(self, attachment: dict):
+        """Swaps an attachment's URL for a re-signed one if it has expired, or is about to, while queued."""
+        if not is_url_stale(attachment["url"]):
+            return
+        refreshed = self.url_refresher.refresh(attachment["url"])
+        if refreshed:
+            attachment["url"] = refreshed
+        else:
+            logging.warning(f"Could not refresh the expired URL of {attachment.get('filename')}; trying it anyway.")
+
+    def _start_services(self):
+        """Starts what every engine needs: the gallery, probe and fingerprint pools, proxy validation."""
         rebuild_html_index(self.download_dir)
+        self.index_rebuilder.start()
+        self.probe_pool = concurrent.futures.ProcessPoolExecutor(max_workers=max(1, PROBE_WORKERS))
+        if PROXY_VALIDATE_ON_START and any(not route.direct for route in self.routes.values()):
+            self._validate_proxies()
+        self._start_fingerprinting()
+        waiting, given_up = count_download_retries()
+        if waiting or given_up:
+            logging.info(f"Retry queue: {waiting} downloads waiting, {given_up} given up.")
+
+    def _stop_services(self):
+        """Final checkpoint and shutdown of everything _start_services started, once scanning and downloads have stopped."""
+        self._save_state(force=True)
+        for route in self.routes.values():
+            if route.pool:
+                route.pool.save(force=True)
+        # Let in-flight probes finish so their files are categorized before the last index rebuild.
+        self.probe_pool.shutdown(wait=True)
+        if self.fingerprint_pool:
+            # Queued backlog fingerprints are dropped; they are picked up again on the next start.
+            self.fingerprint_pool.shutdown(wait=True, cancel_futures=True)
+        self.index_rebuilder.stop()
+        self.transport.close()
+        get_metadata_store().flush()
+        self._update_gui_status("Scraper Stopped.")
+
+    def run(self):
+        self._start_services()
+        self._start_download_workers()
+        self.retry_thread = threading.Thread(target=self._retry_loop, name="retry-scheduler", daemon=True)
+        self.retry_thread.start()
+        self.scanner_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, CHANNEL_SCANNERS), thread_name_prefix="channel-scanner")
         self._update_gui_status("Scraper Started.")
         
+        scans = set()
+        idle = False
         while not self.stop_event.is_set():
             if self.paused:
                 self.stop_event.wait(2)
                 continue
             
-            channel_list = list(self.channels_to_scan.keys())
-            random.shuffle(channel_list)
-            
-            for channel_id in channel_list:
-                if self.stop_event.is_set(): break
-                self._process_channel(channel_id)
-                
-                if not self.stop_event.is_set():
-                    inter_channel_delay = random.uniform(5, 15)
-                    self.stop_event.wait(inter_channel_delay)
-
-            if self.stop_event.is_set(): break
-            
-            long_sleep_duration = random.uniform(SLEEP_AFTER_NO_MESSAGES - 60, SLEEP_AFTER_NO_MESSAGES + 60)
-            self._update_gui_status(f"Cycle complete. Waiting for ~{int(long_sleep_duration / 60)} minutes...")
-            self.stop_event.wait(long_sleep_duration)
+            # Due channels go to free scanners, most overdue first; the rate-limit governor paces their API calls.
+            scans = {future for future in scans if not future.done()}
+            for channel_id in self.channel_scheduler.pop_due(max(1, CHANNEL_SCANNERS) - len(scans)):
+                scans.add(self.scanner_pool.submit(self._scan_channel, channel_id))
 
-        self._update_gui_status("Scraper Stopped.")
+            if scans:
+                idle = False
+            elif not idle:
+                idle = True
+                self._save_state(force=True)
+                logging.info(f"Transport {self.transport.summary()}.")
+                if self.channels_to_scan:
+                    next_poll = format_duration(self.channel_scheduler.next_due_in())
+                    self._update_gui_status(f"Channels up to date. Next poll in {next_poll} ({self.channel_scheduler.summary()}).")
+            self.stop_event.wait(min(self.channel_scheduler.next_due_in(), 1.0))
+
+        self.scanner_pool.shutdown(wait=True)
+        self.retry_thread.join()
+        self._save_state(force=True)
+        self._stop_download_workers()
+        self._stop_services()
+
+    def _scan_channel(self, channel_id: str):
+        """Runs one channel scan on a scanner thread, never letting two scanners share a channel."""
+        if self.stop_event.is_set(): return None
+        with self.state_lock:
+            if channel_id in self.active_channels: return None
+            self.active_channels.add(channel_id)
+        try:
+            result = self._process_channel(channel_id)
+        except Exception as e:
+            logging.error(f"Scan of channel {channel_id} failed: {e}")
+            result = None
+        finally:
+            with self.state_lock:
+                self.active_channels.discard(channel_id)
+        self._reschedule_channel(channel_id, result)
+        return result
+
+    def _reschedule_channel(self, channel_id: str, result):
+        """Feeds a scan result to the poll scheduler and saves the channel's activity with its cursors."""
+        activity = self.channel_scheduler.record(channel_id, result)
+        self._update_state({f"{channel_id}_activity": activity})
         
-    def _process_messages(self, messages: list, channel_id: str):
-        if not messages:
-            return 0
-            
+    def _process_messages(self, messages: list, channel_id: str, lane: str = LIVE_LANE) -> tuple[int, str]:
+        """
+        Queues the videos of a page in order. Returns (videos queued, id of the last message whose
+        videos were all queued). That id only falls short of the page's last message when a stop cut
+        the page off, e.g. while waiting on a full lane; the cursor must not move past it.
+        """
         found_count = 0
+        last_done_id = None
+        for msg in messages:
+            for attachment, _ in self._video_attachments([msg]):
+                if self.stop_event.is_set():
+                    return found_count, last_done_id
+                if self._enqueue_download(attachment, msg, channel_id, lane):
+                    found_count += 1
+                elif self.stop_event.is_set():
+                    # The stop came while this one waited for room, so it was never queued.
+                    return found_count, last_done_id
+            last_done_id = msg['id']
+        return found_count, last_done_id
+
+    @staticmethod
+    def _video_attachments(messages: list):
         for msg in messages:
-            if self.stop_event.is_set(): break
             for attachment in msg.get("attachments", []):
                 if attachment.get("content_type", "").startswith("video/"):
-                    unique_id = f"{msg['id']}-{attachment['id']}"
-                    if unique_id not in self.downloaded_attachments:
-                        self._download_file(attachment, msg, channel_id)
-                        found_count += 1
-        return found_count
+                    yield attachment, msg
 
-    def _process_channel(self, channel_id: str):
+    def _process_channel(self, channel_id: str) -> dict:
         scan_mode = self.channels_to_scan[channel_id]
         url = f"{DISCORD_API_BASE}/channels/{channel_id}/messages"
         
+        result = self._catch_up_new_messages(channel_id, url)
+
+        if self.stop_event.is_set(): return result
+
+        history_complete_key = f"{channel_id}_history_complete"
+        # Without a free backfill slot the channel is simply backfilled on a later poll.
+        backfilled = False
+        if scan_mode == 'full_scan' and not self.scraper_state.get(history_complete_key, False) and self.backfill_slots.acquire(blocking=False):
+            try:
+                self._backfill_history(channel_id, url)
+                backfilled = True
+            finally:
+                self.backfill_slots.release()
+        # A channel still behind, or whose backfill made progress this pass, is polled again soon.
+        # One that only waited for a slot keeps its activity-based interval.
+        result["backlog"] = not result["caught_up"] or (backfilled and not self.scraper_state.get(history_complete_key, False))
+        return result
+
+    def _catch_up_new_messages(self, channel_id: str, url: str) -> dict:
+        """Pages the 'after' cursor forward until a short page arrives or CATCHUP_MAX_PAGES_PER_CYCLE is hit."""
+        after_key = f"{channel_id}_after"
+        pages = 0
+        new_messages = 0
+        videos_found = 0
+        caught_up = False
+
         self._update_gui_status(f"Checking for new messages in {channel_id}...")
-        after_id = self.scraper_state.get(f"{channel_id}_after")
-        params = {'limit': MESSAGES_LIMIT}
-        if after_id:
-            params['after'] = after_id
+        while not self.stop_event.is_set():
+            if CATCHUP_MAX_PAGES_PER_CYCLE and pages >= CATCHUP_MAX_PAGES_PER_CYCLE: break
+
+            after_id = self.scraper_state.get(after_key)
+            params = {'limit': MESSAGES_LIMIT}
+            if after_id:
+                params['after'] = after_id
 
-        response = self._execute_request_with_failover(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
-        if response:
+            response = self._execute_request_with_failover(url, params=params)
+            if not response:
+                break
             messages = response.json()
+            pages += 1
+
             if messages:
                 messages.reverse()
-                self._process_messages(messages, channel_id)
-                self.scraper_state[f"{channel_id}_after"] = messages[-1]['id']
-                self._save_state()
+                found, last_done_id = self._process_messages(messages, channel_id)
+                videos_found += found
+                new_messages += len(messages)
+                if last_done_id:
+                    self._update_state({after_key: last_done_id})
+                if last_done_id != messages[-1]['id']:
+                    break
 
-        if self.stop_event.is_set(): return
+            # Without a cursor the API returns the newest page, so there is nothing to catch up on.
+            if len(messages) < MESSAGES_LIMIT or not after_id:
+                caught_up = True
+                break
+
+        return self._finish_catch_up(channel_id, pages, new_messages, videos_found, caught_up)
+
+    def _finish_catch_up(self, channel_id: str, pages: int, new_messages: int, videos_found: int, caught_up: bool) -> dict:
+        """Records and reports how far behind a channel still is after its catch-up pass."""
+        # When the cap is hit mid-backlog, the channel is as far behind as its last processed message is old.
+        newest_id = self.scraper_state.get(f"{channel_id}_after")
+        lag_seconds = 0.0
+        if not caught_up and newest_id:
+            lag_seconds = max(0.0, time.time() - snowflake_to_timestamp(newest_id))
+        self.channel_lag[channel_id] = lag_seconds
+
+        if caught_up:
+            logging.info(f"Channel {channel_id} is caught up ({new_messages} new messages over {pages} pages).")
+        else:
+            logging.warning(f"Channel {channel_id} is still {format_duration(lag_seconds)} behind after {pages} pages.")
+            self._update_gui_status(f"Channel {channel_id} is {format_duration(lag_seconds)} behind, continuing next cycle...")
+
+        return {"pages": pages, "new_messages": new_messages, "videos": videos_found, "caught_up": caught_up, "lag_seconds": lag_seconds}
+
+    def _backfill_history(self, channel_id: str, url: str):
+        """Pages 'before' cursors back to back until history is complete or the cycle budget runs out."""
+        before_key = f"{channel_id}_before"
+        started_at = time.monotonic()
+        pages = 0
+        videos_found = 0
+
+        self._update_gui_status(f"Backfilling history for {channel_id}...")
+        while not self.stop_event.is_set():
+            if BACKFILL_MAX_PAGES_PER_CYCLE and pages >= BACKFILL_MAX_PAGES_PER_CYCLE: break
+            if BACKFILL_MAX_SECONDS_PER_CYCLE and time.monotonic() - started_at >= BACKFILL_MAX_SECONDS_PER_CYCLE: break
 
-        history_complete_key = f"{channel_id}_history_complete"
-        if scan_mode == 'full_scan' and not self.scraper_state.get(history_complete_key, False):
-            self._update_gui_status(f"Backfilling history for {channel_id}...")
             # Make sure params are reset for the 'before' call
             params = {'limit': MESSAGES_LIMIT}
-            before_id = self.scraper_state.get(f"{channel_id}_before")
+            before_id = self.scraper_state.get(before_key)
             if before_id:
                 params['before'] = before_id
 
-            response = self._execute_request_with_failover(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
-            if response:
-                messages = response.json()
-                if messages:
-                    self._process_messages(messages, channel_id)
-                    self.scraper_state[f"{channel_id}_before"] = messages[-1]['id']
-                    self._save_state()
-                else:
-                    logging.info(f"Reached the beginning of history for channel {channel_id}. Marking as complete.")
-                    self._update_gui_status(f"History scan for {channel_id} is complete!")
-                    self.scraper_state[history_complete_key] = True
-                    self._save_state()
+            response = self._execute_request_with_failover(url, params=params)
+            if not response:
+                break
+            messages = response.json()
+            pages += 1
+
+            if messages:
+                found, last_done_id = self._process_messages(messages, channel_id, BACKFILL_LANE)
+                videos_found += found
+                # Checkpoint every page so an interrupted backfill resumes where it stopped.
+                if last_done_id:
+                    self._update_state({before_key: last_done_id})
+                if last_done_id != messages[-1]['id']:
+                    break
+
+            # A short page means there is nothing older left to fetch.
+            if len(messages) < MESSAGES_LIMIT:
+                self._mark_history_complete(channel_id)
+                break
+
+            if pages % 10 == 0:
+                self._update_gui_status(f"Backfilling {channel_id}: {pages} pages, {videos_found} videos queued...")
+
+        logging.info(f"Backfill of {channel_id} covered {pages} pages ({videos_found} videos) in {time.monotonic() - started_at:.1f}s this cycle.")
+
+    def _mark_history_complete(self, channel_id: str):
+        logging.info(f"Reached the beginning of history for channel {channel_id}. Marking as complete.")
+        self._update_gui_status(f"History scan for {channel_id} is complete!")
+        self._update_state({f"{channel_id}_history_complete": True}, force=True)
+
+    @staticmethod
+    def _category_folder_for(result):
+        """Maps a probe result to its category folder, or None when the container is unknown."""
+        if result is None:
+            return None
+        if not result.valid:
+            return "Invalid_or_Corrupt"
+        if result.has_audio is None:
+            return None
+        return "With_Audio" if result.has_audio else "Without_Audio"
+
+    def _categorize_download(self, final_filename: str, filepath: str, probe_future: concurrent.futures.Future):
+        """Moves a downloaded file into its category folder once the header probe has finished."""
+        try:
+            result = probe_future.result()
+        except Exception as e:
+            # The probe process itself died (e.g. the pool was shut down); leave the file uncategorized.
+            logging.error(f"Could not categorize video {final_filename}. Error: {e}")
+            self.index_rebuilder.request()
+            return
+
+        category_folder = self._category_folder_for(result)
+        if not result.valid:
+            logging.warning(f"'{final_filename}' looks corrupt: {result.error}")
+        if category_folder is None:
+            logging.info(f"Could not identify the container of '{final_filename}'; leaving it uncategorized.")
+            self.index_rebuilder.request()
+            return
+
+        try:
+            target_dir = os.path.join(self.download_dir, category_folder)
+            target_path = os.path.join(target_dir, final_filename)
+            if os.path.abspath(target_path) != os.path.abspath(filepath):
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(filepath, target_path)
+
+            update_video_location(final_filename, f"{category_folder}/{final_filename}", category_folder, duration=result.duration, has_audio=result.has_audio)
+            logging.info(f"Moved '{final_filename}' to '{category_folder}' folder.")
+            self._update_gui_status(f"Categorized: {final_filename}")
+            if result.valid:
+                self._request_fingerprint(final_filename, target_path, result.duration)
+        except Exception as e:
+            logging.error(f"Could not categorize video {final_filename}. Error: {e}")
+        self.index_rebuilder.request()
+
+    def _start_fingerprinting(self):
+        """Loads known fingerprints and queues videos from earlier runs that have none yet."""
+        if find_ffmpeg() is None:
+            logging.warning("ffmpeg not found; near-duplicate detection is disabled.")
+            return
+        for filename, hashes, near_duplicate_of in load_video_fingerprints():
+            self.near_duplicate_index.add(filename, hashes, near_duplicate_of)
+        self.fingerprint_pool = concurrent.futures.ProcessPoolExecutor(max_workers=max(1, FINGERPRINT_WORKERS))
+        backlog = find_unfingerprinted_videos(FINGERPRINT_BACKLOG_PER_RUN)
+        for row in backlog:
+            self._request_fingerprint(row["download_filename"], os.path.join(self.download_dir, row["relative_path"]), row["duration"])
+        if backlog:
+            logging.info(f"Queued {len(backlog)} earlier videos for near-duplicate fingerprinting.")
+
+    def _request_fingerprint(self, final_filename: str, filepath: str, duration: float = None):
+        if self.fingerprint_pool is None:
+            return
+        future = self.fingerprint_pool.submit(fingerprint_file, filepath, duration, FINGERPRINT_SAMPLES)
+        future.add_done_callback(lambda f: self._record_fingerprint(final_filename, f))
+
+    def _record_fingerprint(self, final_filename: str, fingerprint_future: concurrent.futures.Future):
+        """Stores a video's keyframe hashes and flags it if it copies an earlier video."""
+        if fingerprint_future.cancelled():
+            return
+        try:
+            result = fingerprint_future.result()
+            if result.error:
+                logging.info(f"Could not fingerprint '{final_filename}': {result.error}")
+                return
+            original = self.near_duplicate_index.find_match(result.hashes)
+            self.near_duplicate_index.add(final_filename, result.hashes, original)
+            save_video_fingerprint(final_filename, result.hashes)
+            if original:
+                mark_near_duplicate(final_filename, original)
+                logging.info(f"'{final_filename}' looks like a re-encoded copy of '{original}'.")
+                self._update_gui_status(f"Near-duplicate: {final_filename}")
+                self.index_rebuilder.request()
+        except Exception as e:
+            logging.error(f"Could not fingerprint video {final_filename}. Error: {e}")
+
+    def _find_part_file(self, unique_id: str):
+        """Returns the .part file left by an earlier attempt at this attachment, if any."""
+        for folder in [""] + CATEGORY_FOLDERS:
+            part_path = os.path.join(self.download_dir, folder, f"{unique_id}.part")
+            if os.path.exists(part_path):
+                return part_path
+        return None
+
+    def _new_part_path(self, unique_id: str, sniff_result) -> str:
+        """Places a new .part file in its category folder if the sniffer decided one, else in the root."""
+        category_folder = self._category_folder_for(sniff_result)
+        target_dir = os.path.join(self.download_dir, category_folder) if category_folder else self.download_dir
+        os.makedirs(target_dir, exist_ok=True)
+        return os.path.join(target_dir, f"{unique_id}.part")
+
+    def _stream_attachment(self, attachment: dict, unique_id: str):
+        """
+        Streams an attachment into its .part file, resuming with a Range request if an earlier
+        attempt left one behind. Returns (part_path, sniff_result, hasher), or None if stopped. The
+        sniff result is None when the part was resumed or the headers could not be found early.
+        """
+        part_path = self._find_part_file(unique_id)
+        offset = os.path.getsize(part_path) if part_path else 0
+        expected_size = attachment.get("size")
+        if part_path and expected_size and offset >= expected_size:
+            return PartFileWriter(self._new_part_path, unique_id, part_path).finish()
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        r = self._execute_request_with_failover(attachment["url"], traffic=DOWNLOAD_TRAFFIC, stream=True, headers=headers)
+        if not r:
+            raise DownloadError("request failed on every route")
+
+        with r:
+            part_path = self._check_resume(attachment, part_path, offset, r.status_code)
+            writer = PartFileWriter(self._new_part_path, unique_id, part_path)
+            try:
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if self.stop_event.is_set():
+                        logging.info(f"Download of {attachment.get('filename')} paused by stop signal; partial file kept for resume.")
+                        return None
+                    writer.write(chunk)
+                    self._throttle(r, len(chunk))
+                return writer.finish()
+            finally:
+                writer.close()
+
+    @staticmethod
+    def _check_resume(attachment: dict, part_path: str, offset: int, status_code: int):
+        """Returns the .part to append to, or None (after deleting it) if the server ignored the Range request."""
+        if offset and status_code != 206:
+            logging.info(f"Server ignored the Range request for {attachment.get('filename')}; restarting from byte 0.")
+            os.remove(part_path)
+            return None
+        if offset:
+            logging.info(f"Resuming {attachment.get('filename')} from byte {offset}.")
+        return part_path
+
+    def _fetch_head_digest(self, attachment: dict):
+        """Hashes just the first PARTIAL_HASH_BYTES of an attachment, or returns None if they can't be fetched."""
+        head_size = min(PARTIAL_HASH_BYTES, attachment["size"])
+        r = self._execute_request_with_failover(attachment["url"], traffic=DOWNLOAD_TRAFFIC, stream=True,
+                                                headers={"Range": f"bytes=0-{head_size - 1}"})
+        if not r:
+            return None
+        hasher = ContentHasher()
+        received = 0
+        with r:
+            # A server that ignores the Range sends the whole file; stop reading once the head is in.
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                chunk = chunk[:head_size - received]
+                hasher.update(chunk)
+                received += len(chunk)
+                self._throttle(r, len(chunk))
+                if received >= head_size:
+                    break
+        return hasher.head_digest() if received == head_size else None
+
+    def _throttle(self, response, received: int):
+        """Waits as long as the bandwidth limits require after receiving a chunk of a download."""
+        delay = self.bandwidth.consume(response.via_proxy, received)
+        if delay:
+            self.stop_event.wait(delay)
+
+    def _find_known_repost(self, attachment: dict, unique_id: str):
+        """
+        Checks whether an attachment is a repost of a stored video before downloading it. Only
+        attachments matching a stored video's size and filename cost a small ranged request.
+        """
+        candidates = self._repost_candidates(attachment, unique_id)
+        if not candidates:
+            return None
+        with self.routes[DOWNLOAD_TRAFFIC].slots:
+            head_digest = self._fetch_head_digest(attachment)
+        return self._match_repost(candidates, head_digest)
+
+    def _repost_candidates(self, attachment: dict, unique_id: str) -> list:
+        if not attachment.get("size") or self._find_part_file(unique_id):
+            return []
+        return find_dedup_candidates(attachment["size"], attachment.get("filename"))
+
+    @staticmethod
+    def _match_repost(candidates: list, head_digest: str):
+        for candidate in candidates:
+            if head_digest and candidate["head_sha256"] == head_digest:
+                return candidate["original"], head_digest
+        return None
+
+    def _claim_content_hash(self, content_sha256: str, final_filename: str):
+        """Returns the filename of a video already holding this content, or claims the hash for final_filename."""
+        with self.download_lock:
+            original = self.content_hashes.get(content_sha256)
+            if original is None:
+                row = find_video_by_content_hash(content_sha256)
+                original = row["download_filename"] if row else None
+            if original is None:
+                self.content_hashes[content_sha256] = final_filename
+            return original
+
+    def _record_duplicate(self, unique_id: str, metadata: dict, original: str):
+        """Stores a repost as a reference to the original video instead of a second copy."""
+        metadata.update({"duplicate_of": original, "relative_path": None, "category": "Duplicate"})
+        save_metadata_to_db(metadata)
+        with self.download_lock:
+            self.downloaded_attachments.add(unique_id)
+            append_downloaded_attachment(unique_id)
+        logging.info(f"Skipped '{metadata['download_filename']}': same content as '{original}'.")
+        self._update_gui_status(f"Duplicate skipped: {metadata['download_filename']}")
+
+    def _verify_part_size(self, part_path: str, expected_size):
+        """Checks a finished .part against the attachment size the API reported."""
+        actual_size = os.path.getsize(part_path)
+        if not expected_size or actual_size == expected_size:
+            return actual_size
+        if actual_size > expected_size:
+            os.remove(part_path)
+            raise DownloadError(f"got {actual_size} bytes but the attachment is {expected_size} bytes; discarded")
+        raise DownloadError(f"transfer ended early at {actual_size}/{expected_size} bytes")
 
     def _download_file(self, attachment: dict, message_data: dict, channel_id: str):
         unique_id = f"{message_data['id']}-{attachment['id']}"
-        if unique_id in self.downloaded_attachments: return
+        if unique_id in self.downloaded_attachments:
+            self._clear_retry(unique_id)
+            return
 
         final_filename = generate_clean_filename(attachment.get("filename"), message_data.get("content", ""))
-        filepath = os.path.join(self.download_dir, final_filename)
+        expected_size = attachment.get("size")
         
         try:
-            r = self._execute_request_with_failover(attachment["url"], stream=True, timeout=REQUEST_TIMEOUT_SECONDS)
-
-            if not r:
-                logging.error(f"Download failed for {attachment.get('filename')} after trying all proxies.")
+            self._ensure_fresh_url(attachment)
+            repost = self._find_known_repost(attachment, unique_id)
+            if repost:
+                self._record_repost(attachment, message_data, channel_id, unique_id, final_filename, repost)
+                self._clear_retry(unique_id)
                 return
 
-            with r:
-                r.raise_for_status()
-                with open(filepath, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if self.stop_event.is_set():
-                            logging.info(f"Download of {final_filename} cancelled by stop signal.")
-                            if os.path.exists(filepath):
-                                os.remove(filepath)
-                            return
-                        f.write(chunk)
-            
-            metadata = build_metadata_to_save(attachment, message_data, final_filename, channel_id)
-            save_metadata_to_db(metadata)
+            # Each retry resumes from whatever the previous attempt left in the .part file.
+            for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+                try:
+                    if attempt > 1:
+                        self._ensure_fresh_url(attachment)
+                    with self.routes[DOWNLOAD_TRAFFIC].slots:
+                        streamed = self._stream_attachment(attachment, unique_id)
+                    if streamed is None:
+                        self._schedule_retry(attachment, message_data, channel_id, "interrupted by stop", count_attempt=False)
+                        return
+                    file_size = self._verify_part_size(streamed[0], expected_size)
+                    break
+                except (DownloadError, requests.exceptions.RequestException) as e:
+                    if attempt == DOWNLOAD_MAX_ATTEMPTS:
+                        logging.error(f"Download failed for {attachment.get('filename')} after {attempt} attempts: {e}")
+                        self._schedule_retry(attachment, message_data, channel_id, e)
+                        return
+                    logging.warning(f"Attempt {attempt}/{DOWNLOAD_MAX_ATTEMPTS} for {attachment.get('filename')} failed: {e}")
+                    self.stop_event.wait(min(2 ** attempt, 30))
+                    if self.stop_event.is_set():
+                        self._schedule_retry(attachment, message_data, channel_id, e, count_attempt=False)
+                        return
+
+            self._finalize_download(attachment, message_data, channel_id, unique_id, final_filename, streamed, file_size)
+            self._clear_retry(unique_id)
+
+        except Exception as e:
+            # Any .part file is left in place so the next attempt can resume it.
+            logging.error(f"Failed to download {attachment.get('filename')}: {e}")
+            self._schedule_retry(attachment, message_data, channel_id, e)
+
+    def _record_repost(self, attachment: dict, message_data: dict, channel_id: str, unique_id: str, final_filename: str, repost):
+        original, head_digest = repost
+        metadata = build_metadata_to_save(attachment, message_data, final_filename, channel_id, file_size=attachment.get("size"))
+        metadata["head_sha256"] = head_digest
+        self._record_duplicate(unique_id, metadata, original)
 
+    def _finalize_download(self, attachment: dict, message_data: dict, channel_id: str, unique_id: str,
+                           final_filename: str, streamed: tuple, file_size: int):
+        """Turns a verified .part into a stored video: dedup check, rename, metadata, then categorization."""
+        part_path, sniff_result, hasher = streamed
+        metadata = build_metadata_to_save(attachment, message_data, final_filename, channel_id, file_size=file_size)
+        metadata.update({"content_sha256": hasher.content_digest(), "head_sha256": hasher.head_digest()})
+        original = self._claim_content_hash(metadata["content_sha256"], final_filename)
+        if original:
+            os.remove(part_path)
+            self._record_duplicate(unique_id, metadata, original)
+            return
+
+        # Commit: the verified .part becomes the final file in the same folder.
+        filepath = os.path.join(os.path.dirname(part_path), final_filename)
+        os.replace(part_path, filepath)
+        
+        category_folder = self._category_folder_for(sniff_result)
+        if category_folder:
+            metadata.update({
+                "relative_path": f"{category_folder}/{final_filename}", "category": category_folder,
+                "duration": sniff_result.duration, "has_audio": sniff_result.has_audio,
+            })
+        else:
+            current_folder = os.path.relpath(os.path.dirname(filepath), self.download_dir)
+            if current_folder != ".":
+                metadata.update({"relative_path": f"{current_folder}/{final_filename}", "category": current_folder})
+        save_metadata_to_db(metadata)
+
+        # Workers finish concurrently; the tracker file and HTML index are shared.
+        with self.download_lock:
             self.downloaded_attachments.add(unique_id)
             self.download_count += 1
-            save_downloaded_attachments(self.downloaded_attachments)
-            rebuild_html_index(self.download_dir)
-            self._update_gui_status(f"Downloaded: {final_filename}")
+            append_downloaded_attachment(unique_id)
+        self._update_gui_status(f"Downloaded: {final_filename}")
 
-            # --- Post-processing: Categorize by Audio ---
-            try:
-                # Use 'filepath' which is the known location of the downloaded file
-                video_path = filepath
-                
-                with VideoFileClip(video_path) as clip:
-                    has_audio = clip.audio is not None
-
-                if has_audio:
-                    category_folder = "With_Audio"
-                else:
-                    category_folder = "Without_Audio"
-                
-                target_dir = os.path.join(self.download_dir, category_folder)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                new_video_path = os.path.join(target_dir, final_filename)
-                shutil.move(video_path, new_video_path)
-                
-                logging.info(f"Moved '{final_filename}' to '{category_folder}' folder.")
-                self._update_gui_status(f"Categorized: {final_filename}")
-            
-            except Exception as e:
-                logging.error(f"Could not categorize video {final_filename}. Error: {e}")
+        if category_folder:
+            logging.info(f"Saved '{final_filename}' straight to '{category_folder}' folder.")
+            self.index_rebuilder.request()
+            if sniff_result.valid:
+                self._request_fingerprint(final_filename, filepath, sniff_result.duration)
+        else:
+            # --- Post-processing: headers were not seen during the stream, probe the file in the process pool ---
+            future = self.probe_pool.submit(probe_file, filepath)
+            future.add_done_callback(lambda f: self._categorize_download(final_filename, filepath, f))
 
-        except Exception as e:
-            logging.error(f"Failed to download {attachment.get('filename')}: {e}")
-            if os.path.exists(filepath): 
-                os.remove(filepath)
\ No newline at end of file
@@ -0,0 +1,199 @@
+# transport.py
+"""
+HTTP transports used by ScraperLogic. Each proxy (and the direct route) gets its own
+long-lived client with a keep-alive connection pool, so a request reuses a warm
+connection to discord.com or the CDN instead of paying for a new TLS handshake.
+
+RequestsTransport keeps one requests.Session per proxy. HttpxTransport, used when httpx
+and h2 are installed, keeps one httpx.Client per proxy and speaks HTTP/2, multiplexing
+concurrent requests over a single connection. Both return requests-style responses and
+raise requests exceptions, so callers do not care which one is in use.
+"""
+import time
+import random
+import logging
+import datetime
+import threading
+import importlib.util
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_TRANSPORT, TRANSPORT_POOL_SIZE, USER_AGENT_LIST
+
+try:
+    import httpx # Optional: HTTP/2 support (also needs the 'h2' package)
+except ImportError:
+    httpx = None
+if importlib.util.find_spec("h2") is None:
+    httpx = None
+
+
+class _TransportBase:
+    def __init__(self, base_headers: dict):
+        self.base_headers = dict(base_headers)
+        self._clients = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def _client_for(self, proxy):
+        with self._lock:
+            client = self._clients.get(proxy)
+            if client is None:
+                # One User-Agent per connection pool, like a real browser behind that address.
+                headers = {"User-Agent": random.choice(USER_AGENT_LIST), **self.base_headers}
+                client = self._clients[proxy] = self._new_client(proxy, headers)
+            self._requests[proxy] = self._requests.get(proxy, 0) + 1
+            return client
+
+    def get(self, url: str, proxy: str = None, **kwargs):
+        return self.request("GET", url, proxy, **kwargs)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                client.close()
+            except Exception as e:
+                logging.debug(f"Error closing HTTP client: {e}")
+
+    def summary(self) -> str:
+        stats = self.stats()
+        requests_sent = sum(s["requests"] for s in stats.values())
+        connections = sum(s["connections"] for s in stats.values())
+        return f"{self.name}: {requests_sent} requests over {connections} connections on {len(stats)} routes"
+
+
+class RequestsTransport(_TransportBase):
+    name = "HTTP/1.1 (requests)"
+
+    def _new_client(self, proxy, headers):
+        session = requests.Session()
+        session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=TRANSPORT_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if proxy:
+            session.proxies = {"http": proxy, "https": proxy}
+        return session
+
+    def request(self, method: str, url: str, proxy: str = None, **kwargs):
+        return self._client_for(proxy).request(method, url, **kwargs)
+
+    def stats(self) -> dict:
+        """Per route: requests sent and connections opened (each one a TCP/TLS handshake)."""
+        stats = {}
+        with self._lock:
+            for proxy, session in self._clients.items():
+                opened = 0
+                for adapter in set(session.adapters.values()):
+                    for manager in [adapter.poolmanager, *adapter.proxy_manager.values()]:
+                        for key in list(manager.pools.keys()):
+                            pool = manager.pools.get(key)
+                            if pool is not None:
+                                opened += pool.num_connections
+                stats[proxy or "direct"] = {"requests": self._requests.get(proxy, 0), "connections": opened}
+        return stats
+
+
+class _HttpxResponse:
+    """Gives an httpx response the parts of the requests.Response interface the scraper uses."""
+
+    def __init__(self, response, started_at: float):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+        # Time until the headers arrived, the same thing requests reports.
+        self.elapsed = datetime.timedelta(seconds=time.monotonic() - started_at)
+
+    @property
+    def content(self) -> bytes:
+        return self._response.read()
+
+    def json(self):
+        return self._response.json()
+
+    def iter_content(self, chunk_size: int = 1):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.HTTPError as e:
+            raise _map_httpx_error(e) from e
+
+    def raise_for_status(self):
+        if 400 <= self.status_code:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _map_httpx_error(e: Exception) -> requests.exceptions.RequestException:
+    """Translates httpx exceptions into the requests exceptions the failover logic handles."""
+    if isinstance(e, httpx.ProxyError):
+        return requests.exceptions.ProxyError(str(e))
+    if isinstance(e, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(e))
+    if isinstance(e, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(str(e))
+    if isinstance(e, (httpx.ConnectError, httpx.RemoteProtocolError)):
+        return requests.exceptions.ConnectionError(str(e))
+    if isinstance(e, httpx.TransportError):
+        return requests.exceptions.ChunkedEncodingError(str(e))
+    return requests.exceptions.RequestException(str(e))
+
+
+class HttpxTransport(_TransportBase):
+    name = "HTTP/2 (httpx)"
+
+    def _new_client(self, proxy, headers):
+        limits = httpx.Limits(max_connections=TRANSPORT_POOL_SIZE, max_keepalive_connections=TRANSPORT_POOL_SIZE)
+        return httpx.Client(http2=True, proxy=proxy, headers=headers, limits=limits, follow_redirects=True)
+
+    def request(self, method: str, url: str, proxy: str = None, headers: dict = None, params: dict = None, json=None,
+                timeout=None, stream: bool = False):
+        try:
+            client = self._client_for(proxy)
+        except (ImportError, ValueError) as e:
+            # e.g. a socks5:// proxy without the httpx[socks] extra installed.
+            raise requests.exceptions.ProxyError(f"cannot use proxy {proxy}: {e}") from e
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+            timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        started_at = time.monotonic()
+        try:
+            request = client.build_request(method, url, headers=headers, params=params, json=json, timeout=timeout)
+            response = client.send(request, stream=stream)
+        except httpx.HTTPError as e:
+            raise _map_httpx_error(e) from e
+        return _HttpxResponse(response, started_at)
+
+    def stats(self) -> dict:
+        """Per route: requests sent, open connections, and how many of those speak HTTP/2."""
+        stats = {}
+        with self._lock:
+            for proxy, client in self._clients.items():
+                # httpx does not expose its pool publicly; read it defensively.
+                pool = getattr(getattr(client, "_transport", None), "_pool", None)
+                connections = list(getattr(pool, "connections", []))
+                http2 = sum(1 for c in connections if getattr(c, "is_http2", False) or "HTTP/2" in repr(c))
+                stats[proxy or "direct"] = {"requests": self._requests.get(proxy, 0), "connections": len(connections), "http2": http2}
+        return stats
+
+
+def create_transport(base_headers: dict):
+    """Returns the transport picked by HTTP_TRANSPORT: 'httpx', 'requests', or 'auto' (httpx if installed)."""
+    if HTTP_TRANSPORT in ("httpx", "auto"):
+        if httpx is not None:
+            return HttpxTransport(base_headers)
+        if HTTP_TRANSPORT == "httpx":
+            logging.warning("httpx/h2 are not installed; falling back to HTTP/1.1 via requests.")
+    return RequestsTransport(base_headers)
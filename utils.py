@@ -6,19 +6,40 @@ import re
 import random
 import html
 import math
-import sqlite3
-
-from config import PROXIES_FILE, DOWNLOADED_TRACKER_FILE, DOWNLOAD_DIR
-from moviepy import VideoFileClip # Using the corrected import
-
-# Database file path is now built using your config
-DATABASE_FILE = os.path.join(DOWNLOAD_DIR, "sql_database", "metadata.db")
+import hashlib
+import io
+import time
+import tempfile
+
+import threading
+
+from config import (
+    PROXIES_FILE, DOWNLOADED_TRACKER_FILE, DOWNLOADED_JOURNAL_FILE, TRACKER_COMPACT_SLACK,
+    HTML_INDEX_DEBOUNCE_SECONDS, HTML_INDEX_MAX_DELAY_SECONDS, PARTIAL_HASH_BYTES,
+    DISCORD_EPOCH_MS
+)
+from metadata_store import get_metadata_store
+
+# Columns added to the videos table after its first release, migrated in by init_database.
+_ADDED_VIDEO_COLUMNS = {
+    # Where a downloaded file ended up, filled in once it is categorized.
+    "relative_path": "TEXT",
+    "category": "TEXT",
+    "file_size": "INTEGER",
+    "duration": "REAL",
+    "has_audio": "INTEGER",
+    # Content hashes used to skip reposted videos.
+    "original_filename": "TEXT",
+    "content_sha256": "TEXT",
+    "head_sha256": "TEXT",
+    "duplicate_of": "TEXT",
+    "near_duplicate_of": "TEXT",
+}
 
 def init_database():
     """Creates the database and the 'videos' table if they don't exist."""
     try:
-        os.makedirs(os.path.dirname(DATABASE_FILE), exist_ok=True)
-        con = sqlite3.connect(DATABASE_FILE)
+        con = get_metadata_store().connect()
         cur = con.cursor()
         cur.execute("""
             CREATE TABLE IF NOT EXISTS videos (
@@ -30,9 +51,49 @@ def init_database():
                 timestamp TEXT,
                 prompt TEXT,
                 attachment_json TEXT,
-                discord_message_url TEXT
+                discord_message_url TEXT,
+                relative_path TEXT,
+                category TEXT,
+                file_size INTEGER,
+                duration REAL,
+                has_audio INTEGER,
+                original_filename TEXT,
+                content_sha256 TEXT,
+                head_sha256 TEXT,
+                duplicate_of TEXT,
+                near_duplicate_of TEXT
+            )
+        """)
+        # Keyframe hashes as comma-separated hex; empty when the video had no usable frames.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS video_fingerprints (
+                download_filename TEXT PRIMARY KEY,
+                frame_hashes TEXT NOT NULL
+            )
+        """)
+        # Downloads waiting to be retried; next_attempt_at is NULL once one has been given up on.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS download_retries (
+                unique_id TEXT PRIMARY KEY,
+                channel_id TEXT,
+                attachment_json TEXT NOT NULL,
+                message_json TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL,
+                last_error TEXT,
+                first_failed_at REAL,
+                updated_at REAL
             )
         """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_download_retries_due ON download_retries (next_attempt_at)")
+        # Migrate databases created before the newer columns existed.
+        existing_columns = {row[1] for row in cur.execute("PRAGMA table_info(videos)")}
+        for column, column_type in _ADDED_VIDEO_COLUMNS.items():
+            if column not in existing_columns:
+                cur.execute(f"ALTER TABLE videos ADD COLUMN {column} {column_type}")
+                logging.info(f"Added '{column}' column to the videos table.")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_videos_content_sha256 ON videos (content_sha256)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_videos_size_name ON videos (file_size, original_filename)")
         con.commit()
         con.close()
     except Exception as e:
@@ -40,11 +101,8 @@ def init_database():
         raise
 
 def save_metadata_to_db(metadata: dict):
-    """Saves a single video's metadata to the SQLite database."""
+    """Queues a single video's metadata for the next batched commit to the SQLite database."""
     try:
-        con = sqlite3.connect(DATABASE_FILE)
-        cur = con.cursor()
-        
         params = {
             "download_filename": metadata.get("download_filename"),
             "message_id": metadata.get("message_id"),
@@ -54,27 +112,156 @@ def save_metadata_to_db(metadata: dict):
             "timestamp": metadata.get("timestamp"),
             "prompt": metadata.get("prompt"),
             "attachment_json": json.dumps(metadata.get("original_attachment")),
-            "discord_message_url": metadata.get("discord_message_url")
+            "discord_message_url": metadata.get("discord_message_url"),
+            "relative_path": metadata.get("relative_path"),
+            "category": metadata.get("category"),
+            "file_size": metadata.get("file_size"),
+            "duration": metadata.get("duration"),
+            "has_audio": metadata.get("has_audio"),
+            "original_filename": metadata.get("original_filename"),
+            "content_sha256": metadata.get("content_sha256"),
+            "head_sha256": metadata.get("head_sha256"),
+            "duplicate_of": metadata.get("duplicate_of"),
         }
         
-        cur.execute("""
+        get_metadata_store().execute("""
             INSERT OR REPLACE INTO videos (
                 download_filename, message_id, channel_id, author_id, author_name, 
-                timestamp, prompt, attachment_json, discord_message_url
+                timestamp, prompt, attachment_json, discord_message_url,
+                relative_path, category, file_size, duration, has_audio,
+                original_filename, content_sha256, head_sha256, duplicate_of
             ) VALUES (
                 :download_filename, :message_id, :channel_id, :author_id, :author_name, 
-                :timestamp, :prompt, :attachment_json, :discord_message_url
+                :timestamp, :prompt, :attachment_json, :discord_message_url,
+                :relative_path, :category, :file_size, :duration, :has_audio,
+                :original_filename, :content_sha256, :head_sha256, :duplicate_of
             )
         """, params)
-        
-        con.commit()
-        con.close()
     except Exception as e:
         logging.error(f"Failed to save metadata to database for {metadata.get('download_filename')}: {e}")
 
+def update_video_location(download_filename: str, relative_path: str, category: str, file_size: int = None, duration: float = None, has_audio: bool = None):
+    """Records where a video was moved to and what categorization found out about it."""
+    try:
+        get_metadata_store().execute("""
+            UPDATE videos
+            SET relative_path = ?, category = ?,
+                file_size = COALESCE(?, file_size), duration = COALESCE(?, duration), has_audio = COALESCE(?, has_audio)
+            WHERE download_filename = ?
+        """, (relative_path, category, file_size, duration, None if has_audio is None else int(has_audio), download_filename))
+    except Exception as e:
+        logging.error(f"Failed to update location of {download_filename} in database: {e}")
+
+def find_video_by_content_hash(content_sha256: str):
+    """Returns the original (non-duplicate) video row with this SHA-256, or None."""
+    rows = get_metadata_store().query(
+        "SELECT download_filename, relative_path FROM videos WHERE content_sha256 = ? AND duplicate_of IS NULL LIMIT 1",
+        (content_sha256,))
+    return rows[0] if rows else None
+
+def find_dedup_candidates(file_size: int, original_filename: str) -> list:
+    """
+    Returns (original, head_sha256) for stored videos with the same size and Discord filename,
+    which may be the same upload. Earlier reposts resolve to the video they duplicate.
+    """
+    return get_metadata_store().query(
+        "SELECT COALESCE(duplicate_of, download_filename) AS original, head_sha256 FROM videos "
+        "WHERE file_size = ? AND original_filename = ? AND head_sha256 IS NOT NULL",
+        (file_size, original_filename))
+
+def save_video_fingerprint(download_filename: str, hashes: list):
+    get_metadata_store().execute(
+        "INSERT OR REPLACE INTO video_fingerprints (download_filename, frame_hashes) VALUES (?, ?)",
+        (download_filename, ",".join(f"{value:016x}" for value in hashes)))
+
+def load_video_fingerprints() -> list:
+    """Returns (download_filename, hashes, near_duplicate_of) for every fingerprinted video, oldest first."""
+    rows = get_metadata_store().query(
+        "SELECT f.download_filename, f.frame_hashes, v.near_duplicate_of FROM video_fingerprints f "
+        "LEFT JOIN videos v ON v.download_filename = f.download_filename ORDER BY v.timestamp")
+    return [(row["download_filename"], [int(value, 16) for value in row["frame_hashes"].split(",") if value], row["near_duplicate_of"])
+            for row in rows]
+
+def find_unfingerprinted_videos(limit: int) -> list:
+    """Returns stored, playable videos that have not been fingerprinted yet, oldest first."""
+    return get_metadata_store().query(
+        "SELECT download_filename, relative_path, duration FROM videos "
+        "WHERE duplicate_of IS NULL AND relative_path IS NOT NULL AND COALESCE(category, '') != 'Invalid_or_Corrupt' "
+        "AND download_filename NOT IN (SELECT download_filename FROM video_fingerprints) "
+        "ORDER BY timestamp LIMIT ?", (limit,))
+
+def mark_near_duplicate(download_filename: str, original: str):
+    get_metadata_store().execute(
+        "UPDATE videos SET near_duplicate_of = ? WHERE download_filename = ?", (original, download_filename))
+
+def save_download_retry(unique_id: str, channel_id: str, attachment: dict, message_data: dict,
+                        attempts: int, next_attempt_at: float, last_error: str):
+    """Queues a failed download for a later attempt at next_attempt_at (epoch seconds), or None to give up on it."""
+    now = time.time()
+    get_metadata_store().execute("""
+        INSERT INTO download_retries (
+            unique_id, channel_id, attachment_json, message_json, attempts, next_attempt_at, last_error, first_failed_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(unique_id) DO UPDATE SET
+            attachment_json = excluded.attachment_json, attempts = excluded.attempts,
+            next_attempt_at = excluded.next_attempt_at, last_error = excluded.last_error, updated_at = excluded.updated_at
+    """, (unique_id, channel_id, json.dumps(attachment), json.dumps(message_data), attempts, next_attempt_at, last_error, now, now))
+
+def load_due_download_retries(limit: int) -> list:
+    """Returns retries whose backoff has expired, longest overdue first."""
+    return get_metadata_store().query(
+        "SELECT unique_id, channel_id, attachment_json, message_json, attempts FROM download_retries "
+        "WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?", (time.time(), limit))
+
+def postpone_download_retry(unique_id: str, next_attempt_at: float):
+    get_metadata_store().execute(
+        "UPDATE download_retries SET next_attempt_at = ? WHERE unique_id = ?", (next_attempt_at, unique_id))
+
+def delete_download_retry(unique_id: str):
+    get_metadata_store().execute("DELETE FROM download_retries WHERE unique_id = ?", (unique_id,))
+
+def count_download_retries() -> tuple[int, int]:
+    """Returns (waiting, given up) counts of the retry queue."""
+    row = get_metadata_store().query(
+        "SELECT COUNT(next_attempt_at), COUNT(*) - COUNT(next_attempt_at) FROM download_retries")[0]
+    return row[0], row[1]
+
+class ContentHasher:
+    """Computes a file's SHA-256 and the SHA-256 of its first PARTIAL_HASH_BYTES while it is written."""
+
+    def __init__(self):
+        self.full = hashlib.sha256()
+        self.head = hashlib.sha256()
+        self.head_remaining = PARTIAL_HASH_BYTES
+
+    def update(self, data: bytes):
+        self.full.update(data)
+        if self.head_remaining > 0:
+            head_part = data[:self.head_remaining]
+            self.head.update(head_part)
+            self.head_remaining -= len(head_part)
+
+    def update_from_file(self, path: str):
+        """Catches up on bytes an earlier attempt already wrote to a .part file."""
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                self.update(block)
+
+    def content_digest(self) -> str:
+        return self.full.hexdigest()
+
+    def head_digest(self) -> str:
+        return self.head.hexdigest()
+
 # --- UNCHANGED FUNCTIONS ---
+def normalize_proxy_url(proxy: str) -> str:
+    """Adds the default http:// scheme to a bare 'host:port' proxy."""
+    proxy = proxy.strip()
+    if not re.match(r"^(http|https|socks5)://", proxy):
+        proxy = "http://" + proxy
+    return proxy
+
 def load_proxies_from_file(filename: str = PROXIES_FILE) -> list[str]:
-    # ... (this function is unchanged)
     proxies = []
     try:
         if os.path.exists(filename):
@@ -82,9 +269,7 @@ def load_proxies_from_file(filename: str = PROXIES_FILE) -> list[str]:
                 for line in f:
                     proxy = line.strip()
                     if proxy and not proxy.startswith("#"):
-                        if not re.match(r"^(http|https|socks5)://", proxy):
-                            proxy = "http://" + proxy
-                        proxies.append(proxy)
+                        proxies.append(normalize_proxy_url(proxy))
             logging.info(f"Loaded {len(proxies)} proxies from {filename}.")
         else:
             logging.info(f"Proxy file '{filename}' not found. No proxies loaded.")
@@ -102,21 +287,89 @@ def save_proxies_to_file(proxies: list[str], filename: str = PROXIES_FILE):
     except Exception as e:
         logging.error(f"Error saving proxies to file: {e}")
 
+def atomic_write_text(path: str, text: str, backup_path: str = None):
+    """
+    Writes a file via a temporary file and rename, so readers never see a half-written file.
+    If backup_path is given, the previous version is kept there.
+    """
+    # A unique temp file per call, so concurrent writers of the same path never share one.
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with open(fd, "w", encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if backup_path:
+            try:
+                os.replace(path, backup_path)
+            except FileNotFoundError:
+                pass # First write, or another writer just moved it
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# Download workers append to the journal concurrently.
+_journal_lock = threading.Lock()
+
+def migrate_downloaded_tracker():
+    """Converts the legacy JSON tracker into the append-only journal (one-time, on startup)."""
+    if os.path.exists(DOWNLOADED_JOURNAL_FILE) or not os.path.exists(DOWNLOADED_TRACKER_FILE):
+        return
+    try:
+        with open(DOWNLOADED_TRACKER_FILE, "r", encoding='utf-8') as f:
+            legacy_ids = set(json.load(f))
+    except (IOError, json.JSONDecodeError) as e:
+        logging.error(f"Could not read legacy tracker '{DOWNLOADED_TRACKER_FILE}' for migration: {e}")
+        return
+    save_downloaded_attachments(legacy_ids)
+    os.replace(DOWNLOADED_TRACKER_FILE, DOWNLOADED_TRACKER_FILE + ".migrated")
+    logging.info(f"Migrated {len(legacy_ids)} entries from '{DOWNLOADED_TRACKER_FILE}' to '{DOWNLOADED_JOURNAL_FILE}'.")
+
 def load_downloaded_attachments() -> set[str]:
-    # ... (this function is unchanged)
+    """Reads the download journal, compacting it when it has grown redundant or ends in a torn line."""
+    migrate_downloaded_tracker()
+    downloaded = set()
+    line_count = 0
+    torn_tail = False
     try:
-        if os.path.exists(DOWNLOADED_TRACKER_FILE):
-            with open(DOWNLOADED_TRACKER_FILE, "r") as f:
-                return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        logging.warning(f"Downloaded tracker file '{DOWNLOADED_TRACKER_FILE}' is missing or corrupt. Starting fresh.")
-    return set()
+        with _journal_lock, open(DOWNLOADED_JOURNAL_FILE, "r", encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # A crash mid-append leaves a partial last line; drop it.
+                    torn_tail = True
+                    break
+                line_count += 1
+                entry = line.strip()
+                if entry:
+                    downloaded.add(entry)
+    except FileNotFoundError:
+        return downloaded
+    except IOError as e:
+        logging.error(f"Could not read download journal '{DOWNLOADED_JOURNAL_FILE}': {e}")
+        return downloaded
+
+    if torn_tail or line_count - len(downloaded) >= TRACKER_COMPACT_SLACK:
+        save_downloaded_attachments(downloaded)
+    return downloaded
+
+def append_downloaded_attachment(unique_id: str):
+    """Records one finished download by appending a single line to the journal."""
+    try:
+        with _journal_lock, open(DOWNLOADED_JOURNAL_FILE, "a", encoding='utf-8') as f:
+            f.write(unique_id + "\n")
+    except IOError as e:
+        logging.error(f"IOError appending to download journal: {e}")
 
 def save_downloaded_attachments(downloaded_set: set[str]):
-    # ... (this function is unchanged)
+    """Compacts the journal: atomically rewrites it with exactly one line per entry."""
     try:
-        with open(DOWNLOADED_TRACKER_FILE, "w", encoding='utf-8') as f:
-            json.dump(list(downloaded_set), f, indent=2)
+        with _journal_lock:
+            atomic_write_text(DOWNLOADED_JOURNAL_FILE, "".join(f"{entry}\n" for entry in sorted(downloaded_set)))
+        logging.info(f"Compacted download journal to {len(downloaded_set)} entries.")
     except IOError as e:
         logging.error(f"IOError saving downloaded attachments: {e}")
 
@@ -141,8 +394,25 @@ def generate_clean_filename(original_filename: str, message_content: str) -> str
     
     return f"{suggested_title}_{timestamp_prefix}_{random_suffix}{file_extension}"
 
-def build_metadata_to_save(attachment: dict, message_data: dict, final_filename: str, channel_id: str) -> dict:
-    # ... (this function is unchanged)
+def snowflake_to_timestamp(snowflake: str) -> float:
+    """Returns the Unix time (seconds) encoded in a Discord snowflake ID."""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH_MS) / 1000
+
+def format_duration(seconds: float) -> str:
+    """Formats a number of seconds as a short human-readable string, e.g. '2h 5m'."""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds}s"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours}h {minutes}m"
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h"
+
+def build_metadata_to_save(attachment: dict, message_data: dict, final_filename: str, channel_id: str, file_size: int = None) -> dict:
     message_id = message_data.get("id", "unknown_id")
     guild_id = message_data.get("guild_id")
     discord_url = f"https://discord.com/channels/@me/{channel_id}/{message_id}" if not guild_id else f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
@@ -156,6 +426,11 @@ def build_metadata_to_save(attachment: dict, message_data: dict, final_filename:
         "prompt": message_data.get("content", ""),
         "original_attachment": attachment,
         "discord_message_url": discord_url,
+        "original_filename": attachment.get("filename"),
+        # Freshly downloaded files sit in the download root until they are categorized.
+        "relative_path": final_filename,
+        "category": "Uncategorized",
+        "file_size": file_size,
     }
 
 # --- HTML INDEX BUILDER (REWRITTEN FOR FOLDER SEARCH) ---
@@ -303,6 +578,17 @@ def _get_html_header(title: str) -> str:
             color: var(--accent-color-hover);
             text-decoration: underline;
         }}
+        .versions {{
+            font-size: 0.8rem;
+            margin-top: 0.75rem;
+        }}
+        .versions a {{
+            display: block;
+            color: var(--accent-color);
+            text-decoration: none;
+            word-break: break-all;
+            margin-top: 0.25rem;
+        }}
         .pagination {{
             display: flex;
             justify-content: center;
@@ -430,20 +716,68 @@ def _get_pagination_nav(current_page: int, total_pages: int) -> str:
     nav += "</div>"
     return nav
 
+_CATEGORY_FOLDERS = ["With_Audio", "Without_Audio", "Invalid_or_Corrupt"]
+# Hash of what each generated page last contained, so unchanged pages are not rewritten.
+_page_content_hashes = {}
+
+def _locate_video_file(download_dir: str, filename: str):
+    """Probes the category folders for a file. Only needed for rows saved before locations were stored."""
+    for folder in _CATEGORY_FOLDERS + [""]:
+        if os.path.exists(os.path.join(download_dir, folder, filename)):
+            return os.path.join(folder, filename).replace('\\', '/'), folder if folder else "Uncategorized"
+    return None, None
+
+def _backfill_video_locations(download_dir: str, rows: list) -> dict:
+    """Finds files for legacy rows without a stored location once, and saves what it finds."""
+    found = {}
+    for row in rows:
+        relative_path, category = _locate_video_file(download_dir, row["download_filename"])
+        if relative_path:
+            found[row["download_filename"]] = (relative_path, category)
+    if found:
+        try:
+            get_metadata_store().executemany("UPDATE videos SET relative_path = ?, category = ? WHERE download_filename = ?",
+                                             [(path, category, filename) for filename, (path, category) in found.items()])
+            logging.info(f"Stored file locations for {len(found)} videos indexed before locations were tracked.")
+        except Exception as e:
+            logging.error(f"Failed to store backfilled video locations: {e}")
+    return found
+
+def _write_if_changed(path: str, content: str) -> bool:
+    """Writes a generated page only when its content differs from what is already on disk."""
+    digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    previous = _page_content_hashes.get(path)
+    if previous is None and os.path.exists(path):
+        with open(path, "r", encoding='utf-8') as f:
+            previous = hashlib.sha1(f.read().encode('utf-8')).hexdigest()
+    if previous == digest:
+        _page_content_hashes[path] = digest
+        return False
+    with open(path, "w", encoding='utf-8') as f:
+        f.write(content)
+    _page_content_hashes[path] = digest
+    return True
+
 def rebuild_html_index(download_dir: str):
     logging.info("Starting paginated HTML index rebuild from database...")
-    if not os.path.exists(DATABASE_FILE):
-        logging.warning(f"Database file '{DATABASE_FILE}' not found. Cannot build index.")
+    database_file = get_metadata_store().database_file
+    if not os.path.exists(database_file):
+        logging.warning(f"Database file '{database_file}' not found. Cannot build index.")
         return
 
     try:
-        con = sqlite3.connect(DATABASE_FILE)
-        con.row_factory = sqlite3.Row 
-        cur = con.cursor()
-        
-        cur.execute("SELECT * FROM videos ORDER BY timestamp DESC")
-        all_videos = cur.fetchall()
-        con.close()
+        store = get_metadata_store()
+        # Make sure the download that triggered this rebuild has been committed.
+        store.flush()
+        # Reposts are stored as references to the original and are not shown twice.
+        all_videos = store.query("SELECT * FROM videos WHERE duplicate_of IS NULL AND near_duplicate_of IS NULL ORDER BY timestamp DESC")
+        # Re-encoded copies are collapsed into their original's card.
+        other_versions = {}
+        for row in store.query("SELECT download_filename, relative_path, near_duplicate_of FROM videos "
+                               "WHERE duplicate_of IS NULL AND near_duplicate_of IS NOT NULL AND relative_path IS NOT NULL ORDER BY timestamp"):
+            other_versions.setdefault(row["near_duplicate_of"], []).append(row)
+
+        legacy_locations = _backfill_video_locations(download_dir, [row for row in all_videos if not row["relative_path"]])
 
     except Exception as e:
         logging.error(f"Failed to read from database: {e}")
@@ -453,13 +787,14 @@ def rebuild_html_index(download_dir: str):
 
     if not all_videos:
         logging.info("No videos found in database to index.")
-        with open(main_index_path, "w", encoding='utf-8') as f:
-            f.write(_get_html_header("Video Index"))
-            f.write("<header><h1>No Videos Found</h1><p>Start the scraper to download videos.</p></header>")
-            f.write(_get_html_footer())
+        _write_if_changed(main_index_path,
+            _get_html_header("Video Index")
+            + "<header><h1>No Videos Found</h1><p>Start the scraper to download videos.</p></header>"
+            + _get_html_footer())
         return
 
     total_pages = math.ceil(len(all_videos) / VIDEOS_PER_PAGE)
+    pages_written = 0
 
     for page_num in range(1, total_pages + 1):
         page_path = os.path.join(download_dir, f"_page-{page_num}.html")
@@ -467,7 +802,7 @@ def rebuild_html_index(download_dir: str):
         end_index = start_index + VIDEOS_PER_PAGE
         page_videos = all_videos[start_index:end_index]
 
-        with open(page_path, "w", encoding='utf-8') as f:
+        with io.StringIO() as f:
             f.write(_get_html_header(f"Page {page_num} - Scraped Videos"))
             f.write(f"<header><h1>Scraped Videos</h1><p>A collection of all downloaded videos.</p></header>")
             
@@ -485,17 +820,9 @@ def rebuild_html_index(download_dir: str):
 
             for video_row in page_videos:
                 original_filename = video_row["download_filename"]
-                
-                possible_subfolders = ["With_Audio", "Without_Audio", "Invalid_or_Corrupt", ""]
-                
-                found_path = None
-                category = "Uncategorized"
-                for folder in possible_subfolders:
-                    test_path = os.path.join(download_dir, folder, original_filename)
-                    if os.path.exists(test_path):
-                        found_path = os.path.join(folder, original_filename).replace('\\', '/')
-                        category = folder if folder else "Uncategorized"
-                        break
+                found_path, category = video_row["relative_path"], video_row["category"] or "Uncategorized"
+                if not found_path:
+                    found_path, category = legacy_locations.get(original_filename, (None, None))
                 
                 if not found_path:
                     logging.warning(f"Could not find file '{original_filename}'. Skipping from HTML index.")
@@ -504,6 +831,11 @@ def rebuild_html_index(download_dir: str):
                 prompt = video_row['prompt'] or 'No prompt available.'
                 title = os.path.splitext(original_filename)[0].replace('_', ' ').title()
                 discord_link = video_row['discord_message_url'] or '#'
+                versions = other_versions.get(original_filename, [])
+                versions_html = ""
+                if versions:
+                    version_links = "".join(f"<a href='{html.escape(v['relative_path'])}'>{html.escape(v['download_filename'])}</a>" for v in versions)
+                    versions_html = f"<details class='versions'><summary>{len(versions)} similar version{'s' if len(versions) > 1 else ''}</summary>{version_links}</details>"
                 
                 f.write(f"""
                 <div class='video-entry' data-category='{category}'>
@@ -515,6 +847,7 @@ def rebuild_html_index(download_dir: str):
                             <a href='{html.escape(found_path)}' download>Download</a>
                             <a href='{discord_link}' target='_blank'>Discord</a>
                         </div>
+                        {versions_html}
                     </div>
                 </div>
                 """)
@@ -522,13 +855,75 @@ def rebuild_html_index(download_dir: str):
             f.write("</div>")
             f.write(_get_pagination_nav(page_num, total_pages))
             f.write(_get_html_footer())
-        logging.info(f"Generated _page-{page_num}.html with {len(page_videos)} videos.")
+            page_content = f.getvalue()
+        if _write_if_changed(page_path, page_content):
+            pages_written += 1
+            logging.info(f"Generated _page-{page_num}.html with {len(page_videos)} videos.")
     
     # Main index page doesn't need pagination controls, just links to the pages
-    with open(main_index_path, "w", encoding='utf-8') as f:
-        f.write(_get_html_header("Video Index"))
-        f.write(f"<header><h1>Video Page Index</h1><p>A total of {len(all_videos)} videos across {total_pages} pages.</p></header>")
-        f.write(_get_pagination_nav(1, total_pages)) # Show the pagination for context
-        f.write(_get_html_footer())
+    _write_if_changed(main_index_path,
+        _get_html_header("Video Index")
+        + f"<header><h1>Video Page Index</h1><p>A total of {len(all_videos)} videos across {total_pages} pages.</p></header>"
+        + _get_pagination_nav(1, total_pages) # Show the pagination for context
+        + _get_html_footer())
     
-    logging.info("Main _index.html linking to all pages has been created.")
\ No newline at end of file
+    logging.info(f"HTML index up to date: {pages_written} of {total_pages} pages regenerated.")
+
+class DebouncedIndexRebuilder:
+    """
+    Coalesces rebuild requests from the download workers into one rebuild_html_index call.
+    A rebuild runs once requests have been quiet for `delay` seconds, or at most `max_delay`
+    seconds after the first pending request during a steady stream of downloads.
+    """
+
+    def __init__(self, download_dir: str, delay: float = HTML_INDEX_DEBOUNCE_SECONDS, max_delay: float = HTML_INDEX_MAX_DELAY_SECONDS):
+        self.download_dir = download_dir
+        self.delay = delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._first_request_at = None
+        self._last_request_at = None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="html-index-rebuilder", daemon=True)
+        self._thread.start()
+
+    def request(self):
+        with self._condition:
+            now = time.monotonic()
+            if self._first_request_at is None:
+                self._first_request_at = now
+            self._last_request_at = now
+            self._condition.notify()
+
+    def stop(self):
+        """Stops the background thread, running one last rebuild if a request is still pending."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._first_request_at is None and not self._stopping:
+                    self._condition.wait()
+                if self._first_request_at is None:
+                    return
+                while not self._stopping:
+                    now = time.monotonic()
+                    due_at = min(self._last_request_at + self.delay, self._first_request_at + self.max_delay)
+                    if now >= due_at:
+                        break
+                    self._condition.wait(due_at - now)
+                self._first_request_at = None
+                self._last_request_at = None
+            try:
+                rebuild_html_index(self.download_dir)
+            except Exception as e:
+                logging.error(f"HTML index rebuild failed: {e}")
\ No newline at end of file